@@ -0,0 +1,46 @@
+from config import REGIONS, MESES
+
+# Dimensiones del cubo de conteos (además del año de la fecha)
+CUBE_KEYS = ["Region", "Mes", "Estado_Supervision", "Tipo_Fiscalizacion"]
+
+def build_cube(data):
+    # Un único groupby por estado de filtros; todas las métricas salen de aquí
+    year = data["Fecha"].dt.year.rename("Anio")
+    return data.groupby([year] + CUBE_KEYS, dropna=False, observed=True).size()
+
+def select_year(cube, year):
+    return cube[cube.index.get_level_values("Anio") == year]
+
+def select_month(cube, month):
+    if month == "Total":
+        return cube
+    return cube[cube.index.get_level_values("Mes") == month]
+
+def _level_equals(cube, level, value):
+    return cube[cube.index.get_level_values(level) == value]
+
+def select_region(cube, region):
+    return _level_equals(cube, "Region", region)
+
+def summary_metrics(cube):
+    return {
+        "total": int(cube.sum()),
+        "fiscalizados": int(_level_equals(cube, "Estado_Supervision", "Fiscalizado").sum()),
+        "prefiscalizados": int(_level_equals(cube, "Estado_Supervision", "Prefiscalizado").sum()),
+        "cmc": int(_level_equals(cube, "Tipo_Fiscalizacion", "CMC").sum()),
+    }
+
+def fiscalized_by_region(cube, regions=REGIONS):
+    fiscalized = _level_equals(cube, "Estado_Supervision", "Fiscalizado")
+    return fiscalized.groupby(level="Region", observed=True).sum().reindex(regions, fill_value=0)
+
+def fiscalized_matrix(cube, regions=REGIONS, months=MESES):
+    # Conteo de fiscalizados por región (filas) y mes (columnas)
+    fiscalized = _level_equals(cube, "Estado_Supervision", "Fiscalizado")
+    matrix = fiscalized.groupby(level=["Region", "Mes"], observed=True).sum().unstack("Mes")
+    return matrix.reindex(index=regions, columns=months).fillna(0).astype(int)
+
+def status_counts(cube, level):
+    # Conteo por estado de supervisión (columnas) para cada valor de un nivel
+    counts = cube.groupby(level=[level, "Estado_Supervision"], observed=True).sum()
+    return counts.unstack("Estado_Supervision", fill_value=0)
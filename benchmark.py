@@ -0,0 +1,535 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import database
+import snapshot
+from config import REGIONS, MESES, MONTHLY_GOALS
+from utils import compare_with_client_list
+from data_processing import iter_processed_chunks, load_and_process_data
+from aggregation import build_cube, select_month, summary_metrics, fiscalized_by_region, fiscalized_matrix
+from ingestion import ingest_files
+from normalization import load_mappings, normalize_names, month_names
+import visualization
+
+# Tamaños de main_database para el benchmark de carga
+MAIN_SIZES = [2_500, 10_000, 100_000, 1_000_000]
+UPLOAD_SIZE = 500
+
+# Cantidad de códigos en temp_database y en la lista del cliente
+CLIENT_LIST_SIZES = [1_000, 10_000, 100_000]
+
+# Filas de los archivos de supervisión para el benchmark de ingesta
+INGEST_SIZES = [10_000, 50_000]
+
+# Archivos y filas por archivo del lote de fin de mes
+BATCH_FILES = 12
+BATCH_FILE_ROWS = 20_000
+
+# Filas de la carga sintética para medir la normalización
+NORMALIZATION_SIZE = 500_000
+
+# Historial total para el benchmark de filtros en SQL
+FILTER_SIZES = [10_000, 100_000, 1_000_000]
+
+# Historial total para comparar la copia Parquet con la lectura desde SQLite
+SNAPSHOT_SIZES = [100_000, 1_000_000]
+
+# Filas de main_database.xlsx para el benchmark de arranque en frío
+WORKBOOK_SIZES = [2_500, 10_000, 50_000]
+
+# Historial total para el benchmark del pipeline completo del dashboard
+PIPELINE_SIZES = [10_000, 100_000, 1_000_000]
+SUPERVISORS = 40
+
+# Carpeta donde se guardan los resultados en JSON
+RESULTS_DIR = "benchmarks"
+
+MESES_NUM = {7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"}
+
+def synthetic_supervisions(n, seed=0, code_offset=0, supervisors=SUPERVISORS):
+    # Genera supervisiones sintéticas con el mismo esquema que load_and_process_data
+    rng = np.random.default_rng(seed)
+    fechas = pd.Timestamp("2024-07-01") + pd.to_timedelta(rng.integers(0, 184, n), unit="D")
+    return pd.DataFrame({
+        "Fecha": fechas,
+        "Codigo_Interno": (np.arange(n) + code_offset).astype(str),
+        "Region": rng.choice(REGIONS, n),
+        "Nombre_Supervisor": rng.choice([f"SUPERVISOR {i}" for i in range(supervisors)], n),
+        "Estado_Supervision": rng.choice(["Fiscalizado", "Prefiscalizado"], n, p=[0.8, 0.2]),
+        "Mes": pd.Series(fechas.month).map(MESES_NUM).values,
+        "Tipo_Fiscalizacion": rng.choice(["Normal", "CMC"], n, p=[0.85, 0.15]),
+    })
+
+def _create_tables(path, main_rows):
+    database.DB_NAME = path
+    database.migrate()
+    database.append_main_database(main_rows)
+
+def _timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_upload(sizes=MAIN_SIZES, upload_size=UPLOAD_SIZE):
+    # Compara la carga incremental contra la reescritura completa de las tablas
+    original_db = database.DB_NAME
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                path = os.path.join(tmp, f"bench_{size}.db")
+                _create_tables(path, synthetic_supervisions(size))
+                upload = synthetic_supervisions(upload_size, seed=1, code_offset=size)
+
+                def append_upload():
+                    database.append_temp_database(upload.copy())
+                    database.approve_temp_records(upload["Codigo_Interno"])
+
+                def rewrite_upload():
+                    temp_db = pd.concat([database.load_temp_database(), upload])
+                    database.save_temp_database(temp_db)
+                    main_db = pd.concat([database.load_main_database(), database.load_temp_database()])
+                    database.save_main_database(main_db)
+                    database.save_temp_database(database.load_temp_database().iloc[0:0])
+
+                result = {"main_rows": size, "append_s": _timed(append_upload)}
+                if size <= 100_000:
+                    result["rewrite_s"] = _timed(rewrite_upload, repeat=1)
+                results.append(result)
+                print(result)
+    finally:
+        database.DB_NAME = original_db
+    return results
+
+def bench_cold_start(sizes=WORKBOOK_SIZES):
+    # Arranque de la app (ensure_schema) frente a reimportar el libro Excel
+    original_db = database.DB_NAME
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                workdir = os.path.join(tmp, str(size))
+                os.makedirs(workdir)
+                synthetic_supervisions(size).to_excel(os.path.join(workdir, "main_database.xlsx"), index=False)
+                database.DB_NAME = os.path.join(workdir, "supervisiones.db")
+                database.init_db(directory=workdir)
+
+                start = time.perf_counter()
+                database.ensure_schema()
+                cold_start = time.perf_counter() - start
+
+                result = {
+                    "workbook_rows": size,
+                    "ensure_schema_s": cold_start,
+                    "seed_unchanged_s": _timed(lambda: database.seed_from_workbooks(directory=workdir), repeat=1),
+                    "seed_forced_s": _timed(lambda: database.seed_from_workbooks(force=True, directory=workdir), repeat=1),
+                }
+                results.append(result)
+                print(result)
+    finally:
+        database.DB_NAME = original_db
+    return results
+
+def _compare_with_client_list_legacy(temp_db, client_list):
+    # Implementación anterior, O(n·m), conservada solo como referencia
+    temp_set = set(temp_db['Codigo_Interno'])
+    client_set = set(client_list['Codigo_Interno'])
+
+    discrepancies = {
+        'En temp_db pero no aprobado': list(temp_set - client_set),
+        'Aprobado pero no en temp_db': list(client_set - temp_set),
+        'Diferencias en clasificación': []
+    }
+
+    for code in temp_set.intersection(client_set):
+        temp_status = temp_db[temp_db['Codigo_Interno'] == code]['Estado_Supervision'].iloc[0]
+        client_status = client_list[client_list['Codigo_Interno'] == code]['Estado_Supervision'].iloc[0]
+        if temp_status != client_status:
+            discrepancies['Diferencias en clasificación'].append((code, temp_status, client_status))
+
+    return discrepancies
+
+def synthetic_client_list(temp_db, seed=2):
+    # 80 % de los códigos aprobados, 10 % nuevos y un 5 % con otra clasificación
+    rng = np.random.default_rng(seed)
+    client = temp_db.sample(frac=0.8, random_state=seed)[["Codigo_Interno", "Estado_Supervision"]]
+    extra = pd.DataFrame({
+        "Codigo_Interno": (np.arange(len(temp_db) // 10) + 10 * len(temp_db)).astype(str),
+        "Estado_Supervision": "Fiscalizado",
+    })
+    client = pd.concat([client, extra], ignore_index=True)
+    flip = rng.random(len(client)) < 0.05
+    client.loc[flip, "Estado_Supervision"] = "Prefiscalizado"
+    return client
+
+def bench_compare_client_list(sizes=CLIENT_LIST_SIZES, legacy_limit=10_000):
+    results = []
+    for size in sizes:
+        temp_db = synthetic_supervisions(size)
+        client_list = synthetic_client_list(temp_db)
+        start = time.perf_counter()
+        discrepancies = compare_with_client_list(temp_db, client_list)
+        result = {"codes": size, "merge_s": time.perf_counter() - start}
+        if size <= legacy_limit:
+            start = time.perf_counter()
+            legacy = _compare_with_client_list_legacy(temp_db, client_list)
+            result["legacy_s"] = time.perf_counter() - start
+            assert all(len(legacy[key]) == len(discrepancies[key]) for key in legacy)
+        results.append(result)
+        print(result)
+    return results
+
+def synthetic_raw_upload(n, seed=3, supervisors=SUPERVISORS):
+    # Archivo "Fiscalizados" con las columnas originales del sistema de terreno
+    rows = synthetic_supervisions(n, seed=seed, supervisors=supervisors)
+    return pd.DataFrame({
+        "Fecha": rows["Fecha"],
+        "Código interno": rows["Codigo_Interno"].astype(int),
+        "Región": rows["Region"],
+        "Nombre supervisor": rows["Nombre_Supervisor"],
+        "Estado supervisión": rows["Estado_Supervision"],
+    })
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        return elapsed, tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+def bench_ingestion(sizes=INGEST_SIZES):
+    # Memoria pico de la ingesta por bloques frente a leer el libro completo
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"fiscalizados_{size}.xlsx")
+            synthetic_raw_upload(size).to_excel(path, index=False)
+
+            def streaming():
+                for chunk in iter_processed_chunks(path, "Fiscalizados"):
+                    pass
+
+            stream_s, stream_mb = _peak_memory(streaming)
+            full_s, full_mb = _peak_memory(lambda: pd.read_excel(path))
+            result = {"rows": size, "stream_s": stream_s, "stream_peak_mb": stream_mb,
+                      "read_excel_s": full_s, "read_excel_peak_mb": full_mb}
+            results.append(result)
+            print(result)
+    return results
+
+def _write_raw_csv(path, n, seed=3, code_offset=0, supervisors=SUPERVISORS):
+    raw = synthetic_raw_upload(n, seed=seed, supervisors=supervisors)
+    raw["Código interno"] += code_offset
+    raw["Fecha"] = raw["Fecha"].dt.strftime("%d/%m/%Y")
+    raw.to_csv(path, index=False)
+    return path
+
+def bench_parallel_ingestion(files=BATCH_FILES, rows=BATCH_FILE_ROWS, worker_counts=(1, os.cpu_count())):
+    # Lote de archivos CSV leído con 1 proceso frente a uno por núcleo
+    original_db = database.DB_NAME
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [_write_raw_csv(os.path.join(tmp, f"fiscalizados_{i}.csv"), rows, seed=i, code_offset=i * rows)
+                     for i in range(files)]
+            for workers in sorted(set(worker_counts)):
+                _create_tables(os.path.join(tmp, f"lote_{workers}.db"), synthetic_supervisions(0))
+                elapsed = _timed(lambda: ingest_files(paths, workers=workers), repeat=1)
+                result = {"files": files, "rows": files * rows, "workers": workers, "seconds": elapsed,
+                          "rows_per_s": files * rows / elapsed}
+                results.append(result)
+                print(result)
+    finally:
+        database.DB_NAME = original_db
+    return results
+
+MESES_INGLES = {
+    'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo', 'April': 'Abril',
+    'May': 'Mayo', 'June': 'Junio', 'July': 'Julio', 'August': 'Agosto',
+    'September': 'Septiembre', 'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
+}
+
+def _normalize_legacy(df):
+    # Normalización anterior: replace sobre strings y strftime('%B') + map
+    mappings = load_mappings()
+    df = df.copy()
+    df["Mes"] = df["Fecha"].dt.strftime('%B').map(MESES_INGLES)
+    df["Region"] = df["Region"].replace(mappings["region"])
+    df["Nombre_Supervisor"] = df["Nombre_Supervisor"].replace(mappings["supervisor"])
+    return df
+
+def _normalize_categorical(df):
+    df = df.copy()
+    df["Mes"] = month_names(df["Fecha"])
+    df["Region"], _ = normalize_names(df["Region"], "region")
+    df["Nombre_Supervisor"], _ = normalize_names(df["Nombre_Supervisor"], "supervisor")
+    return df
+
+def bench_normalization(size=NORMALIZATION_SIZE):
+    # Carga con los nombres tal como llegan en Prefiscalizados / Fiscalizados CMC
+    mappings = load_mappings()
+    rng = np.random.default_rng(4)
+    raw = synthetic_supervisions(size)
+    raw["Region"] = rng.choice(list(mappings["region"]), size)
+    raw["Nombre_Supervisor"] = rng.choice(list(mappings["supervisor"]), size)
+
+    legacy_s, legacy = _timed(lambda: _normalize_legacy(raw), repeat=1), _normalize_legacy(raw)
+    new_s, new = _timed(lambda: _normalize_categorical(raw), repeat=1), _normalize_categorical(raw)
+    for column in ("Mes", "Region", "Nombre_Supervisor"):
+        assert (legacy[column] == new[column].astype(object)).all()
+    result = {"rows": size, "legacy_s": legacy_s, "categorical_s": new_s}
+    print(result)
+    return result
+
+def bench_filter_pushdown(sizes=FILTER_SIZES):
+    # Una región y un mes de selección: SQL filtrado frente a cargar todo y filtrar en pandas
+    original_db = database.DB_NAME
+    query = database.query_supervisiones.__wrapped__
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                _create_tables(os.path.join(tmp, f"filtros_{size}.db"), synthetic_supervisions(size))
+                start, end = pd.Timestamp("2024-09-01").date(), pd.Timestamp("2024-09-30").date()
+
+                def pandas_filter():
+                    data = query()
+                    data = data[data["Region"].isin(["VALPARAISO"])]
+                    return data[(data["Fecha"].dt.date >= start) & (data["Fecha"].dt.date <= end)]
+
+                result = {
+                    "history_rows": size,
+                    "sql_filter_s": _timed(lambda: query((), ("VALPARAISO",), start, end)),
+                    "pandas_filter_s": _timed(pandas_filter, repeat=1),
+                }
+                results.append(result)
+                print(result)
+    finally:
+        database.DB_NAME = original_db
+    return results
+
+def bench_snapshot(sizes=SNAPSHOT_SIZES, upload_size=UPLOAD_SIZE):
+    # Historial completo desde la vista SQL frente a la copia Parquet mapeada en memoria
+    original_db, original_dir = database.DB_NAME, snapshot.SNAPSHOT_DIR
+    query = database.query_supervisiones.__wrapped__
+    load = snapshot.load_snapshot.__wrapped__
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                _create_tables(os.path.join(tmp, f"snapshot_{size}.db"), synthetic_supervisions(size))
+                snapshot.SNAPSHOT_DIR = os.path.join(tmp, f"snapshot_{size}")
+                result = {"history_rows": size, "full_write_s": _timed(snapshot.refresh_snapshot, repeat=1)}
+                database.append_temp_database(synthetic_supervisions(upload_size, seed=1, code_offset=size))
+                result["incremental_write_s"] = _timed(snapshot.refresh_snapshot, repeat=1)
+                result["sqlite_load_s"] = _timed(query)
+                result["parquet_load_s"] = _timed(load)
+                result["sqlite_mb"] = query().memory_usage(deep=True).sum() / 1e6
+                result["parquet_mb"] = load().memory_usage(deep=True).sum() / 1e6
+                results.append(result)
+                print(result)
+    finally:
+        database.DB_NAME, snapshot.SNAPSHOT_DIR = original_db, original_dir
+    return results
+
+def _region_pies_legacy(regions, goals, progress):
+    # Versión anterior: una figura px.pie por región, serializada por separado
+    import plotly.express as px
+    payloads = []
+    for region, goal, prog in zip(regions, goals, progress):
+        pie_data = pd.DataFrame({'Categoría': ['Fiscalizados', 'Faltantes'],
+                                 'Cantidad': [prog, max(goal - prog, 0)]})
+        fig = px.pie(pie_data, values='Cantidad', names='Categoría', title=f'{region}',
+                     color_discrete_map={'Fiscalizados': '#508C9B', 'Faltantes': '#201E43'})
+        fig.update_traces(textposition='inside', textinfo='percent+value')
+        fig.update_layout(showlegend=False, height=300, width=300)
+        payloads.append(fig.to_json())
+    return payloads
+
+def bench_figures():
+    # Construcción + serialización (lo que hace st.plotly_chart) de los gráficos de metas
+    goals = tuple(sum(MONTHLY_GOALS[month][i] for month in MESES) for i in range(len(REGIONS)))
+    progress = tuple(int(g * 0.6) for g in goals)
+    fiscalized = pd.DataFrame({month: [int(g * 0.5) for g in MONTHLY_GOALS[month]] for month in MESES},
+                              index=REGIONS)
+    pies = visualization.create_region_pies
+
+    def uncached_heatmap():
+        visualization._heatmap_figure.cache_clear()
+        return visualization.create_heatmap(MONTHLY_GOALS, fiscalized).to_json()
+
+    results = {
+        "pies_legacy_s": _timed(lambda: _region_pies_legacy(REGIONS, goals, progress)),
+        "pies_subplot_s": _timed(lambda: pies.__wrapped__(tuple(REGIONS), goals, progress).to_json()),
+        "pies_cached_s": _timed(lambda: pies(tuple(REGIONS), goals, progress).to_json()),
+        "heatmap_build_s": _timed(uncached_heatmap),
+        "heatmap_cached_s": _timed(lambda: visualization.create_heatmap(MONTHLY_GOALS, fiscalized).to_json()),
+    }
+    print(results)
+    return results
+
+def synthetic_locales(supervisions, seed=5, comunas=20):
+    # Locales por supervisar: los códigos ya supervisados más un 20 % sin visitar
+    rng = np.random.default_rng(seed)
+    codes = supervisions["Codigo_Interno"].drop_duplicates()
+    extra = (np.arange(len(codes) // 5) + 10 * len(supervisions)).astype(str)
+    codes = np.concatenate([codes.to_numpy(), extra])
+    n = len(codes)
+    return pd.DataFrame({
+        "Código interno": codes,
+        "Tipo de Realizacion": rng.choice(["Presencial", "Remota"], n),
+        "Tipo establecimiento": rng.choice(["Supermercado", "Almacén", "Farmacia"], n),
+        "RUT comercio": [f"{i}-K" for i in range(n)],
+        "Comercio": [f"COMERCIO {i}" for i in range(n)],
+        "Dirección": [f"CALLE {i}" for i in range(n)],
+        "Comuna": [f"COMUNA {i}" for i in rng.integers(0, comunas, n)],
+        "Región": rng.choice(REGIONS, n),
+    })
+
+def bench_pipeline(sizes=PIPELINE_SIZES, supervisors=SUPERVISORS):
+    # Cada etapa del dashboard sobre un historial sintético de tamaño creciente,
+    # sin la caché de datos ni la de figuras
+    original = database.DB_NAME, database.LOCALES_DB_NAME
+    goals = pd.DataFrame({month: MONTHLY_GOALS[month] for month in MESES}, index=REGIONS)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                database.DB_NAME = os.path.join(tmp, f"pipeline_{size}.db")
+                database.LOCALES_DB_NAME = os.path.join(tmp, f"locales_{size}.db")
+                database.migrate()
+                raw_path = _write_raw_csv(os.path.join(tmp, f"carga_{size}.csv"), size, supervisors=supervisors)
+                history = synthetic_supervisions(size, supervisors=supervisors)
+                temp_db = synthetic_supervisions(min(size, 100_000), seed=1, code_offset=size,
+                                                 supervisors=supervisors)
+                client_list = synthetic_client_list(temp_db)
+                result = {"history_rows": size, "supervisors": supervisors}
+
+                result["load_and_process_data_s"] = _timed(
+                    lambda: load_and_process_data(raw_path, "Fiscalizados"), repeat=1)
+                result["append_main_database_s"] = _timed(lambda: database.append_main_database(history), repeat=1)
+                result["save_temp_database_s"] = _timed(lambda: database.save_temp_database(temp_db), repeat=1)
+                result["save_locales_db_s"] = _timed(
+                    lambda: database.save_locales_db(synthetic_locales(history)), repeat=1)
+
+                data = database.query_supervisiones.__wrapped__()
+                result["load_all_data_s"] = _timed(database.query_supervisiones.__wrapped__)
+                result["load_locations_to_supervise_s"] = _timed(database.load_locations_to_supervise.__wrapped__)
+
+                def aggregate():
+                    cube = build_cube(data)
+                    summary_metrics(select_month(cube, "Septiembre"))
+                    fiscalized_by_region(cube, REGIONS)
+                    return fiscalized_matrix(cube, REGIONS, MESES)
+
+                result["aggregation_s"] = _timed(aggregate)
+                fiscalized = aggregate()
+
+                def heatmap():
+                    visualization._heatmap_figure.cache_clear()
+                    return visualization.create_heatmap(goals, fiscalized).to_json()
+
+                result["create_heatmap_s"] = _timed(heatmap)
+                result["compare_with_client_list_s"] = _timed(
+                    lambda: compare_with_client_list(temp_db, client_list))
+                results.append(result)
+                print(result)
+    finally:
+        database.DB_NAME, database.LOCALES_DB_NAME = original
+    return results
+
+BENCHMARKS = {
+    "pipeline": bench_pipeline,
+    "upload": bench_upload,
+    "cold_start": bench_cold_start,
+    "compare_client_list": bench_compare_client_list,
+    "ingestion": bench_ingestion,
+    "parallel_ingestion": bench_parallel_ingestion,
+    "normalization": bench_normalization,
+    "filter_pushdown": bench_filter_pushdown,
+    "snapshot": bench_snapshot,
+    "figures": bench_figures,
+}
+
+def _is_duration(key):
+    # Tiempos en segundos; rows_per_s es un rendimiento y no se compara como tiempo
+    return key == "seconds" or (key.endswith("_s") and not key.endswith("_per_s"))
+
+def _is_measure(key):
+    return _is_duration(key) or key.endswith("_per_s") or key.endswith("_mb")
+
+def _stage_times(results):
+    # Aplana {benchmark: [filas]} a {(benchmark, parámetros, medida): segundos}. Los
+    # parámetros son todos los campos que no son medidas (tamaño, procesos, ...)
+    times = {}
+    for name, rows in results.items():
+        for row in rows if isinstance(rows, list) else [rows]:
+            params = tuple((key, value) for key, value in row.items() if not _is_measure(key))
+            for key, value in row.items():
+                if _is_duration(key):
+                    times[(name, params, key)] = value
+    return times
+
+def compare_runs(previous, current, threshold=1.2):
+    # Lista las medidas que empeoraron más que threshold respecto a la corrida anterior
+    before, after = _stage_times(previous["results"]), _stage_times(current["results"])
+    regressions = []
+    for key in sorted(before.keys() & after.keys(), key=str):
+        if before[key] > 0 and after[key] / before[key] > threshold:
+            regressions.append({"benchmark": key[0], "size": dict(key[1]), "stage": key[2],
+                                "before_s": before[key], "after_s": after[key]})
+    return regressions
+
+def run_benchmarks(names=None, sizes=None, supervisors=SUPERVISORS, output=None):
+    results = {}
+    for name in names or BENCHMARKS:
+        print(f"== {name}")
+        if name == "pipeline":
+            results[name] = bench_pipeline(sizes or PIPELINE_SIZES, supervisors)
+        else:
+            results[name] = BENCHMARKS[name]()
+    run = {
+        "fecha": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, pd.Timestamp.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2, default=str)
+    print(f"Resultados guardados en {output}")
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks con datos sintéticos")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks a ejecutar (por defecto, todos)")
+    parser.add_argument("--sizes", nargs="+", type=int, help="Tamaños del historial para el benchmark pipeline")
+    parser.add_argument("--supervisors", type=int, default=SUPERVISORS, help="Cantidad de supervisores sintéticos")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para detectar regresiones")
+    args = parser.parse_args()
+    run = run_benchmarks(args.only, args.sizes, args.supervisors, args.output)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare_runs(json.load(f), run)
+        for regression in regressions:
+            print(f"Regresión: {regression}")
+        if not regressions:
+            print("Sin regresiones respecto a " + args.compare)
@@ -0,0 +1,86 @@
+import threading
+from functools import wraps
+
+import pandas as pd
+
+# Lector de las versiones de datos por tabla; database.py lo registra con
+# set_version_reader y las guarda en SQLite, donde cada escritura las incrementa
+_version_reader = None
+
+# Resultados cacheados por función: nombre -> (clave de versión, {argumentos: resultado})
+_store = {}
+_stats = {}
+_lock = threading.RLock()
+
+# Máximo de combinaciones de argumentos guardadas por función
+MAX_ENTRIES = 32
+
+def set_version_reader(reader):
+    # reader(tables) devuelve una clave con las versiones actuales de esas tablas
+    global _version_reader
+    _version_reader = reader
+
+def cached(tables):
+    # Cachea el resultado mientras no cambie la versión de las tablas indicadas;
+    # escrituras a otras tablas no lo invalidan.
+    # Se devuelve una copia superficial: reasignar columnas no altera la caché.
+    def decorator(func):
+        name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            version_key = _version_reader(tables) if _version_reader is not None else ()
+            arg_key = (tuple(_freeze(a) for a in args),
+                       tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())))
+            with _lock:
+                stats = _stats.setdefault(name, {"hits": 0, "misses": 0})
+                entry = _store.get(name)
+                if entry is not None and entry[0] == version_key and arg_key in entry[1]:
+                    stats["hits"] += 1
+                    return _shallow_copy(entry[1][arg_key])
+                stats["misses"] += 1
+            result = func(*args, **kwargs)
+            with _lock:
+                entry = _store.get(name)
+                if entry is None or entry[0] != version_key:
+                    entry = _store[name] = (version_key, {})
+                entry[1][arg_key] = result
+                if len(entry[1]) > MAX_ENTRIES:
+                    entry[1].pop(next(iter(entry[1])))
+            return _shallow_copy(result)
+
+        return wrapper
+    return decorator
+
+def _freeze(value):
+    # Listas y conjuntos (p. ej. selecciones de un multiselect) como claves
+    if isinstance(value, (list, set, frozenset)):
+        return tuple(sorted(value, key=str)) if isinstance(value, (set, frozenset)) else tuple(value)
+    return value
+
+def _shallow_copy(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+def memory_usage(value):
+    # Bytes ocupados por un resultado, contando el contenido de las cadenas
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return 0
+
+def get_cache_memory():
+    # Memoria compartida por todas las sesiones, por función cacheada
+    with _lock:
+        return {name: sum(memory_usage(result) for result in entry[1].values())
+                for name, entry in _store.items()}
+
+def get_cache_stats():
+    with _lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+def clear_cache():
+    with _lock:
+        _store.clear()
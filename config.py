@@ -1,4 +1,5 @@
-from PIL import Image
+import os
+from functools import lru_cache
 
 # Definir las regiones
 REGIONS = [
@@ -20,7 +21,7 @@ REGIONS = [
     "VALPARAISO"
 ]
 
-# Definir las metas mensuales
+# Definir las metas mensuales (valores iniciales de la tabla metas)
 MONTHLY_GOALS = {
     "Julio": [9, 20, 15, 11, 31, 53, 31, 43, 36, 113, 24, 42, 10, 551, 12, 78],
     "Agosto": [9, 20, 15, 11, 31, 53, 31, 43, 36, 113, 24, 42, 10, 551, 12, 78],
@@ -30,8 +31,20 @@ MONTHLY_GOALS = {
     "Diciembre": [3, 7, 5, 4, 10, 18, 10, 14, 12, 38, 8, 14, 3, 184, 4, 26]
 }
 
+# Año al que corresponden las metas de MONTHLY_GOALS
+GOALS_YEAR = 2024
+
 # Lista de meses
 MESES = ["Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
 
+# Filas por página en las tablas del dashboard
+PAGE_SIZE = 500
+
 # Page icon
-logo = Image.open('CMC360 Isotípo.png')
\ No newline at end of file
+LOGO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CMC360 Isotípo.png')
+
+@lru_cache(maxsize=None)
+def get_logo():
+    # PIL y la imagen se cargan al primer uso, no al importar config
+    from PIL import Image
+    return Image.open(LOGO_FILE)
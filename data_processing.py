@@ -1,8 +1,131 @@
+import os
 import pandas as pd
+from normalization import normalize_names, month_names
+from profiling import profiled
 
-def load_and_process_data(file, data_type):
-    df = pd.read_excel(file)
-    
+# Filas por bloque en la ingesta por streaming
+CHUNK_SIZE = 5000
+
+OUTPUT_COLUMNS = ["Fecha", "Codigo_Interno", "Region", "Nombre_Supervisor", "Estado_Supervision", "Mes", "Tipo_Fiscalizacion"]
+
+SUPPORTED_EXTENSIONS = (".xls", ".xlsx", ".csv", ".parquet")
+
+# Columnas de código en los archivos de origen; se leen como texto
+CODE_COLUMNS = ("Código interno", "Numero Comercio")
+
+# Encabezados que identifican cada tipo de archivo, en el orden en que se prueban
+HEADER_SIGNATURES = {
+    "Fiscalizados": {"Código interno", "Nombre supervisor"},
+    "Prefiscalizados": {"Numero Comercio", "Nombre Fiscalizador"},
+    "Fiscalizados CMC": {"Numero Comercio", "Nombre"},
+}
+
+def _file_name(file):
+    return str(getattr(file, "name", file)).lower()
+
+def _iter_excel_rows(file, chunksize, progress):
+    # openpyxl en modo read_only recorre las filas sin cargar el libro completo
+    from openpyxl import load_workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = sheet.max_row - 1 if sheet.max_row else None
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        buffer, done = [], 0
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            buffer.append(row)
+            if len(buffer) >= chunksize:
+                done += len(buffer)
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+                progress(done, total)
+        if buffer:
+            done += len(buffer)
+            yield pd.DataFrame(buffer, columns=header)
+            progress(done, total)
+    finally:
+        workbook.close()
+
+def _iter_parquet_rows(file, chunksize, progress):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(file)
+    total, done = parquet_file.metadata.num_rows, 0
+    for batch in parquet_file.iter_batches(batch_size=chunksize):
+        done += batch.num_rows
+        yield batch.to_pandas()
+        progress(done, total)
+
+def _iter_csv_rows(file, chunksize, progress):
+    done = 0
+    # Sin dtype, un bloque con un código vacío se infiere como float ("789.0")
+    for chunk in pd.read_csv(file, chunksize=chunksize, dtype=dict.fromkeys(CODE_COLUMNS, str)):
+        done += len(chunk)
+        yield chunk
+        progress(done, None)
+
+def iter_raw_chunks(file, chunksize=CHUNK_SIZE, progress=None):
+    # Bloques de filas crudas según el formato del archivo
+    progress = progress or (lambda done, total: None)
+    name = _file_name(file)
+    extension = os.path.splitext(name)[1]
+    if extension == ".csv":
+        yield from _iter_csv_rows(file, chunksize, progress)
+    elif extension == ".parquet":
+        yield from _iter_parquet_rows(file, chunksize, progress)
+    elif extension == ".xls":
+        # xlrd no permite leer por partes; se divide después de leer
+        df = pd.read_excel(file, dtype=dict.fromkeys(CODE_COLUMNS, str))
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+            progress(min(start + chunksize, len(df)), len(df))
+    else:
+        yield from _iter_excel_rows(file, chunksize, progress)
+
+def read_header(file):
+    # Encabezados del archivo leyendo solo la primera fila de datos
+    chunks = iter_raw_chunks(file, chunksize=1)
+    try:
+        first = next(chunks, None)
+    finally:
+        chunks.close()
+    return [] if first is None else [str(column).strip() for column in first.columns]
+
+def detect_data_type(columns):
+    columns = set(columns)
+    for data_type, signature in HEADER_SIGNATURES.items():
+        if signature <= columns:
+            return data_type
+    raise ValueError("No se reconoce el tipo de archivo por sus encabezados: " + ", ".join(sorted(columns)))
+
+def iter_processed_chunks(file, data_type, chunksize=CHUNK_SIZE, progress=None, unknown=None, discarded=None):
+    # unknown, si se entrega, acumula los nombres sin equivalencia por tipo, y
+    # discarded las filas descartadas por motivo
+    for chunk in iter_raw_chunks(file, chunksize, progress):
+        yield process_chunk(chunk, data_type, unknown, discarded)
+
+@profiled
+def load_and_process_data(file, data_type, unknown=None):
+    chunks = list(iter_processed_chunks(file, data_type, unknown=unknown))
+    if not chunks:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
+
+def _code_text(value):
+    # Un número entero leído como float (Excel, o un bloque con celdas vacías)
+    # pierde el ".0"; los vacíos quedan nulos
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip() or None
+
+@profiled
+def process_chunk(df, data_type, unknown=None, discarded=None):
     if data_type == "Fiscalizados":
         df = df.rename(columns={
             "Fecha": "Fecha",
@@ -37,72 +160,21 @@ def load_and_process_data(file, data_type):
     
     # Convertir fecha al formato correcto (día/mes/año)
     df["Fecha"] = pd.to_datetime(df["Fecha"], dayfirst=True, errors='coerce')
-    df["Mes"] = df["Fecha"].dt.strftime('%B').map({
-        'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo', 'April': 'Abril', 
-        'May': 'Mayo', 'June': 'Junio', 'July': 'Julio', 'August': 'Agosto', 
-        'September': 'Septiembre', 'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
-    })
-    
-    # Asegurar que Codigo_Interno sea tipo string
-    df["Codigo_Interno"] = df["Codigo_Interno"].astype(str)
+    df["Mes"] = month_names(df["Fecha"])
     
-    # Unificar nombres de regiones
-    region_mapping = {
-        "Antofagasta": "ANTOFAGASTA",
-        "Arica y Parinacota": "ARICA Y PARINACOTA",
-        "Atacama": "ATACAMA",
-        "Aysén": "AISÉN DEL GRAL. CARLOS IBAÑEZ DEL CAMPO",
-        "Biobío": "DEL BIOBÍO",
-        "Coquimbo": "COQUIMBO",
-        "La Araucanía": "DE LA ARAUCANÍA",
-        "Los Lagos": "DE LOS LAGOS",
-        "Los Ríos": "DE LOS RÍOS",
-        "Magallanes": "MAGALLANES Y DE LA ANTÁRTICA CHILENA",
-        "Maule": "DEL MAULE",
-        "Metropolitana": "METROPOLITANA DE SANTIAGO",
-        "Ñuble": "DE ÑUBLE",
-        "O'Higgins": "DEL LIBERTADOR GRAL. BERNARDO O´HIGGINS",
-        "Tarapacá": "TARAPACÁ",
-        "Valparaíso": "VALPARAISO"
-    }
-    df["Region"] = df["Region"].replace(region_mapping)
+    # Código como texto, igual en todos los bloques
+    df["Codigo_Interno"] = df["Codigo_Interno"].map(_code_text, na_action="ignore").astype(object)
     
-    # Unificar nombres de supervisores
-    supervisor_mapping = {
-        "Alejandra Ibarra": "EUGENIA IBARRA",
-        "Angela Vidal": "ANGELA VIDAL",
-        "Barbara Alvarado  (EDENRED)": "BÁRBARA  ALVARADO",
-        "Camila Lopez": "CAMILA LOPEZ",
-        "Camila Sierra": "CAMILA SIERRA",
-        "Catherine Espinoza": "CATHERINE  ESPINOZA",
-        "Ceci Zapata": "CECILIA  ZAPATA CONTRERAS",
-        "Claudia Vera": "CLAUDIA  VERA",
-        "Claudio Vergara": "CLAUDIO VERGARA",
-        "Daniela Sanmartin": "DANIELA SAN MARTIN",
-        "Deissy Pinochet": "DEISSY  PINOCHET",
-        "Diego Scheel": "DIEGO  SCHEEL",
-        "Dominique Constenla": "DOMINIQUE CONSTENLA",
-        "Francisca Contreras": "FRANCISCA CONTRERAS",
-        "Ignacio Barros": "IGNACIO  BARRIOS",
-        "Isabel Diaz": "ISABEL DIAZ",
-        "Karen Barboza": "KAREN BARBOZA",
-        "Kathi Olivares": "KATHERIN  OLIVARES",
-        "Maria Jose Hermosilla": "MARIAJOSE  HERMOSILLA",
-        "Maria Oyarzun": "MARIA  OYARZUN",
-        "Martin Ibañez": "MARTIN  IBAÑEZ",
-        "Melisa Marin": "MELISA  MARIN",
-        "Nicole Aravena": "NICOLE ARAVENA",
-        "Nicole Toledo": "NICOLE  TOLEDO",
-        "Paulina Alvarez": "PAULINA ALVAREZ",
-        "Sebastian Cornejo": "SEBASTIÁN IGNACIO CORNEJO LEPPE",
-        "Sofia Aranguiz": "SOFIA  ARANGUIZ",
-        "Tamara Ortega": "TAMARA ORTEGA",
-        "Tania Tapia": "TANIA TAPIA ARAYA",
-        "Tomas Guzman": "TOMÁS  GUZMÁN",
-        "Valentia Elia": "VALENTINA  ELIA",
-        "Veronica Cordova": "VERÓNICA CÓRDOVA",
-        "Victoria Landeros": "VICTORIA LANDEROS"
-    }
-    df["Nombre_Supervisor"] = df["Nombre_Supervisor"].replace(supervisor_mapping)
+    # Unificar nombres de regiones y supervisores con la tabla normalizacion.csv
+    df["Region"], unknown_regions = normalize_names(df["Region"], "region")
+    df["Nombre_Supervisor"], unknown_supervisors = normalize_names(df["Nombre_Supervisor"], "supervisor")
+    if unknown is not None:
+        unknown.setdefault("region", set()).update(unknown_regions)
+        unknown.setdefault("supervisor", set()).update(unknown_supervisors)
     
-    return df[["Fecha", "Codigo_Interno", "Region", "Nombre_Supervisor", "Estado_Supervision", "Mes", "Tipo_Fiscalizacion"]].dropna(subset=["Fecha"])
\ No newline at end of file
+    # Filas sin código o sin fecha válida no se guardan; se cuentan en discarded
+    missing_code, missing_date = df["Codigo_Interno"].isna(), df["Fecha"].isna()
+    if discarded is not None:
+        discarded["sin_codigo"] = discarded.get("sin_codigo", 0) + int(missing_code.sum())
+        discarded["sin_fecha"] = discarded.get("sin_fecha", 0) + int((missing_date & ~missing_code).sum())
+    return df.loc[~(missing_code | missing_date), OUTPUT_COLUMNS]
\ No newline at end of file
@@ -1,121 +1,854 @@
+import hashlib
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 import os
+from cache import cached, set_version_reader
+from profiling import profiled
+from config import REGIONS, MONTHLY_GOALS, GOALS_YEAR
+from normalization import MESES_CALENDARIO
+import dedup
 
 DB_NAME = 'supervisiones.db'
 LOCALES_DB_NAME = 'locales_db.db'
+JOBS_DB_NAME = 'trabajos.db'
 
-def get_connection():
-    return sqlite3.connect(DB_NAME)
-
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Crear tablas si no existen
-    cur.execute('''CREATE TABLE IF NOT EXISTS main_database
-                   (Fecha TEXT, Codigo_Interno TEXT, Region TEXT, 
-                    Nombre_Supervisor TEXT, Estado_Supervision TEXT, 
-                    Mes TEXT, Tipo_Fiscalizacion TEXT, Aprobado INTEGER)''')
-    
-    cur.execute('''CREATE TABLE IF NOT EXISTS temp_database
-                   (Fecha TEXT, Codigo_Interno TEXT, Region TEXT, 
-                    Nombre_Supervisor TEXT, Estado_Supervision TEXT, 
-                    Mes TEXT, Tipo_Fiscalizacion TEXT)''')
-    
-    cur.execute('''CREATE TABLE IF NOT EXISTS inconsistencias
-                   (Fecha TEXT, Codigo_Interno TEXT, Region TEXT, 
-                    Nombre_Supervisor TEXT, Estado_Supervision TEXT, 
-                    Mes TEXT, Tipo_Fiscalizacion TEXT)''')
-    
-    conn.commit()
-    conn.close()
-
-    # Copiar datos de main_database.xlsx a la base de datos SQL si existe
-    if os.path.exists("main_database.xlsx"):
-        df = pd.read_excel("main_database.xlsx")
-        engine = create_engine(f'sqlite:///{DB_NAME}')
-        df.to_sql('main_database', engine, if_exists='replace', index=False)
-        print("Datos de main_database.xlsx copiados a la base de datos SQL.")
-
-    init_locales_db()
-
-def init_locales_db():
-    engine = create_engine(f'sqlite:///{LOCALES_DB_NAME}')
-    if os.path.exists("locales_por_supervisar.xlsx"):
-        df = pd.read_excel("locales_por_supervisar.xlsx")
-        df['Código interno'] = df['Código interno'].astype(str)
-        df.to_sql('locales', engine, if_exists='replace', index=False)
-        print("Datos de locales_por_supervisar.xlsx copiados a la base de datos locales_db.")
+# Columnas comunes a main_database, temp_database e inconsistencias
+COLUMNS = ["Fecha", "Codigo_Interno", "Region", "Nombre_Supervisor",
+           "Estado_Supervision", "Mes", "Tipo_Fiscalizacion"]
 
-def load_main_database():
-    engine = create_engine(f'sqlite:///{DB_NAME}')
-    df = pd.read_sql_table('main_database', engine)
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
-    df["Codigo_Interno"] = df["Codigo_Interno"].astype(str)
+# Libros Excel que pueden poblar las tablas: archivo -> tabla
+SEED_WORKBOOKS = {
+    "main_database.xlsx": "main_database",
+    "locales_por_supervisar.xlsx": "locales",
+}
+
+SUPERVISION_TABLES = ("main_database", "temp_database", "inconsistencias")
+
+# Columnas de cada tabla de supervisión; todas TEXT salvo las indicadas
+TABLE_COLUMNS = {
+    "main_database": COLUMNS + ["Aprobado"],
+    "temp_database": COLUMNS,
+    "inconsistencias": COLUMNS + ["Motivo"],
+}
+COLUMN_TYPES = {"Aprobado": "INTEGER"}
+
+# Tipos compactos del dataset en memoria: categorías para las columnas de pocos
+# valores distintos y cadenas Arrow para el código. El mes es ordenado, en
+# orden de calendario, para que los groupby y las tablas por mes salgan ordenados
+CATEGORICAL_COLUMNS = ["Region", "Nombre_Supervisor", "Estado_Supervision", "Mes", "Tipo_Fiscalizacion"]
+CODE_DTYPE = pd.StringDtype("pyarrow")
+MONTH_DTYPE = pd.CategoricalDtype(MESES_CALENDARIO, ordered=True)
+
+# Conversiones para corregir los datos heredados (Fecha DATETIME, código BIGINT)
+COLUMN_CONVERSIONS = {
+    "Fecha": "COALESCE(date(Fecha), Fecha)",
+    "Codigo_Interno": """CASE WHEN typeof(Codigo_Interno) = 'real'
+                              AND Codigo_Interno = CAST(Codigo_Interno AS INTEGER)
+                         THEN CAST(CAST(Codigo_Interno AS INTEGER) AS TEXT)
+                         ELSE CAST(Codigo_Interno AS TEXT) END""",
+}
+
+def _supervision_indexes(table):
+    return [
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_codigo_fecha ON {table} (Codigo_Interno, Fecha)",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_fecha ON {table} (Fecha)",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_region_mes_estado ON {table} (Region, Mes, Estado_Supervision)",
+    ]
+
+def _typed_supervision_tables(conn):
+    # Reconstruir las tablas con tipos consistentes, clave primaria e índices
+    for table in SUPERVISION_TABLES:
+        existing = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+        columns = ", ".join(f"{c} {COLUMN_TYPES.get(c, 'TEXT')}" for c in TABLE_COLUMNS[table])
+        conn.exec_driver_sql(f"CREATE TABLE {table}_nueva (id INTEGER PRIMARY KEY, {columns})")
+        if existing:
+            copied = [c for c in TABLE_COLUMNS[table] if c in existing]
+            select = ", ".join(COLUMN_CONVERSIONS.get(c, f"CAST({c} AS {COLUMN_TYPES.get(c, 'TEXT')})")
+                               for c in copied)
+            conn.exec_driver_sql(f"INSERT INTO {table}_nueva ({', '.join(copied)}) SELECT {select} FROM {table}")
+            conn.exec_driver_sql(f"DROP TABLE {table}")
+        conn.exec_driver_sql(f"ALTER TABLE {table}_nueva RENAME TO {table}")
+        for statement in _supervision_indexes(table):
+            conn.exec_driver_sql(statement)
+
+def _locales_indexes(conn):
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'locales'").scalar()
+    if exists:
+        conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS idx_locales_codigo ON locales ("Código interno")')
+
+def _unified_view_sql():
+    # Unión de las tres tablas con la misma deduplicación que load_all_data:
+    # por (Codigo_Interno, Fecha) gana la última fila de la última tabla
+    selects = []
+    for position, table in enumerate(SUPERVISION_TABLES):
+        aprobado = "Aprobado" if "Aprobado" in TABLE_COLUMNS[table] else "NULL AS Aprobado"
+        conditions = [f"""NOT EXISTS (SELECT 1 FROM {table} AS x WHERE x.Codigo_Interno = t.Codigo_Interno
+                                      AND x.Fecha = t.Fecha AND x.id > t.id)"""]
+        conditions += [f"""NOT EXISTS (SELECT 1 FROM {later} AS x WHERE x.Codigo_Interno = t.Codigo_Interno
+                                       AND x.Fecha = t.Fecha)"""
+                       for later in SUPERVISION_TABLES[position + 1:]]
+        selects.append(f"SELECT {', '.join(COLUMNS)}, {aprobado} FROM {table} AS t WHERE " + " AND ".join(conditions))
+    return "CREATE VIEW supervisiones AS " + " UNION ALL ".join(selects)
+
+def _seed_metas(conn):
+    # Metas de config.MONTHLY_GOALS como filas (año, mes, región)
+    rows = [(GOALS_YEAR, month, region, goal)
+            for month, goals in MONTHLY_GOALS.items() for region, goal in zip(REGIONS, goals)]
+    conn.exec_driver_sql("INSERT OR IGNORE INTO metas (Anio, Mes, Region, Meta) VALUES (?, ?, ?, ?)", rows)
+
+def _fingerprint_rows(rows, columns=COLUMNS):
+    positions = [columns.index(c) for c in dedup.FINGERPRINT_COLUMNS]
+    return [dedup.fingerprint([row[p] for p in positions]) for row in rows]
+
+def _add_fingerprints(conn, rows):
+    if not rows:
+        return
+    conn.exec_driver_sql("INSERT OR IGNORE INTO huellas (Huella) VALUES (?)",
+                         [(fp,) for fp in _fingerprint_rows(rows)])
+
+def _rebuild_fingerprints(conn):
+    # Huellas de todas las filas de supervisión, calculadas en Python
+    conn.exec_driver_sql("DELETE FROM huellas")
+    for table in SUPERVISION_TABLES:
+        rows = conn.exec_driver_sql(f"SELECT {', '.join(COLUMNS)} FROM {table}").fetchall()
+        _add_fingerprints(conn, rows)
+
+def _fingerprint_index(conn):
+    # Columna Motivo en inconsistencias (puede existir si la tabla se creó con el esquema actual)
+    existing = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(inconsistencias)")]
+    if "Motivo" not in existing:
+        conn.exec_driver_sql("ALTER TABLE inconsistencias ADD COLUMN Motivo TEXT")
+    conn.exec_driver_sql("CREATE TABLE huellas (Huella INTEGER PRIMARY KEY)")
+    _rebuild_fingerprints(conn)
+
+def _latest_status_sql(where=""):
+    # Último estado por local a partir de las tres tablas de supervisión: gana la
+    # fecha más reciente y, a igual fecha, la tabla posterior y el id mayor (el
+    # mismo criterio que la vista supervisiones)
+    union = " UNION ALL ".join(f"SELECT Codigo_Interno, Estado_Supervision, Fecha, {rank} AS Prioridad, id "
+                               f"FROM {table}{where}" for rank, table in enumerate(SUPERVISION_TABLES))
+    return ("SELECT Codigo_Interno, Estado_Supervision, Fecha FROM ("
+            "SELECT *, ROW_NUMBER() OVER (PARTITION BY Codigo_Interno "
+            "ORDER BY Fecha DESC, Prioridad DESC, id DESC) AS Orden "
+            f"FROM ({union}) WHERE Codigo_Interno IS NOT NULL) WHERE Orden = 1")
+
+LOCALES_STATUS_REBUILD = [
+    "DELETE FROM locales_status",
+    "INSERT INTO locales_status (Codigo_Interno, Estado_Supervision, Fecha) " + _latest_status_sql(),
+]
+
+# Restringe _latest_status_sql a los códigos de temp.estado_lote (índice por código)
+_STATUS_BATCH_WHERE = " WHERE Codigo_Interno IN (SELECT Codigo_Interno FROM temp.estado_lote)"
+
+# Índice de cobertura por región y comuna: conteos por estado y última visita
+COVERAGE_STATUSES = {"Fiscalizado": "Fiscalizados", "Prefiscalizado": "Prefiscalizados", "Disponible": "Disponibles"}
+
+# Estado de cada local con su región y comuna
+_AREA_STATUS_COLUMNS = '''COALESCE(l."Región", '') AS Region, COALESCE(l.Comuna, '') AS Comuna,
+                           COALESCE(s.Estado_Supervision, 'Disponible') AS Estado_Supervision, s.Fecha'''
+
+def _has_locales(conn):
+    # En una instalación nueva locales_db.db no tiene la tabla hasta subir la lista
+    return conn.exec_driver_sql("SELECT 1 FROM loc.sqlite_master WHERE type = 'table' AND name = 'locales'").scalar()
+
+def _rebuild_coverage(conn):
+    # Recalcula todo el índice; solo al crearlo o al reemplazar locales o el historial
+    conn.exec_driver_sql("DELETE FROM cobertura")
+    if _has_locales(conn):
+        counts = ", ".join(f"SUM(Estado_Supervision = '{status}')" for status in COVERAGE_STATUSES)
+        conn.exec_driver_sql(f'''INSERT INTO cobertura
+                                 SELECT Region, Comuna, COUNT(*), {counts}, MAX(Fecha)
+                                 FROM (SELECT {_AREA_STATUS_COLUMNS} FROM loc.locales AS l
+                                       LEFT JOIN locales_status AS s ON s.Codigo_Interno = l."Código interno")
+                                 GROUP BY Region, Comuna''')
+
+def _coverage_states(conn):
+    # Región, comuna, estado y fecha de los locales cuyos códigos están en temp.estado_lote.
+    # CROSS JOIN fija el orden: se recorre el lote y se buscan sus locales por índice.
+    # Sin tabla de locales no hay cobertura que actualizar
+    if not _has_locales(conn):
+        return []
+    return conn.exec_driver_sql(f'''SELECT {_AREA_STATUS_COLUMNS} FROM temp.estado_lote AS c
+                                    CROSS JOIN loc.locales AS l ON l."Código interno" = c.Codigo_Interno
+                                    LEFT JOIN locales_status AS s ON s.Codigo_Interno = c.Codigo_Interno''').fetchall()
+
+def _update_coverage(conn, before, after):
+    # Aplica la diferencia entre los estados de antes y después del lote
+    deltas = {}
+    for sign, states in ((-1, before), (1, after)):
+        for region, comuna, status, fecha in states:
+            delta = deltas.setdefault((region, comuna), dict.fromkeys(COVERAGE_STATUSES, 0) | {"Fecha": None})
+            if status in COVERAGE_STATUSES:
+                delta[status] += sign
+            if sign == 1 and fecha is not None:
+                delta["Fecha"] = max(delta["Fecha"] or fecha, fecha)
+    if not deltas:
+        return
+    # Parámetros numerados: la fecha (?4) se usa dos veces
+    updates = ", ".join(f"{column} = {column} + ?{number}"
+                        for number, column in enumerate(COVERAGE_STATUSES.values(), start=1))
+    conn.exec_driver_sql(f'''UPDATE cobertura SET {updates},
+                                UltimaVisita = COALESCE(MAX(UltimaVisita, ?4), UltimaVisita, ?4)
+                             WHERE Region = ?5 AND Comuna = ?6''',
+                         [tuple(delta[status] for status in COVERAGE_STATUSES) + (delta["Fecha"],) + area
+                          for area, delta in deltas.items()])
+
+# Migraciones versionadas con PRAGMA user_version; cada entrada es una lista
+# de sentencias SQL o funciones que reciben la conexión, y se aplica una sola
+# vez y en orden
+MIGRATIONS = [
+    # 1: tablas de supervisión y registro de libros importados
+    [
+        '''CREATE TABLE IF NOT EXISTS main_database
+           (Fecha TEXT, Codigo_Interno TEXT, Region TEXT, 
+            Nombre_Supervisor TEXT, Estado_Supervision TEXT, 
+            Mes TEXT, Tipo_Fiscalizacion TEXT, Aprobado INTEGER)''',
+        '''CREATE TABLE IF NOT EXISTS temp_database
+           (Fecha TEXT, Codigo_Interno TEXT, Region TEXT, 
+            Nombre_Supervisor TEXT, Estado_Supervision TEXT, 
+            Mes TEXT, Tipo_Fiscalizacion TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS inconsistencias
+           (Fecha TEXT, Codigo_Interno TEXT, Region TEXT, 
+            Nombre_Supervisor TEXT, Estado_Supervision TEXT, 
+            Mes TEXT, Tipo_Fiscalizacion TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS seed_state
+           (Archivo TEXT PRIMARY KEY, Sha256 TEXT, Importado TEXT)''',
+    ],
+    # 2: columnas tipadas, clave primaria e índices por código, fecha y región/mes/estado
+    [
+        _typed_supervision_tables,
+    ],
+    # 3: vista unificada para consultas filtradas e índice por supervisor
+    [
+        _unified_view_sql(),
+    ] + [f"CREATE INDEX IF NOT EXISTS idx_{t}_supervisor ON {t} (Nombre_Supervisor)" for t in SUPERVISION_TABLES],
+    # 4: estado más reciente por local, mantenido de forma incremental
+    [
+        '''CREATE TABLE locales_status
+           (Codigo_Interno TEXT PRIMARY KEY, Estado_Supervision TEXT, Fecha TEXT)''',
+    ] + LOCALES_STATUS_REBUILD,
+    # 5: metas mensuales por año y región
+    [
+        '''CREATE TABLE metas
+           (Anio INTEGER NOT NULL, Mes TEXT NOT NULL, Region TEXT NOT NULL, Meta INTEGER NOT NULL,
+            PRIMARY KEY (Anio, Mes, Region))''',
+        _seed_metas,
+    ],
+    # 6: huellas de código + fecha + tipo + supervisor para deduplicar cargas
+    [
+        _fingerprint_index,
+    ],
+    # 7: índice de cobertura por región y comuna
+    [
+        '''CREATE TABLE cobertura
+           (Region TEXT NOT NULL, Comuna TEXT NOT NULL, Total INTEGER NOT NULL,
+            Fiscalizados INTEGER NOT NULL, Prefiscalizados INTEGER NOT NULL, Disponibles INTEGER NOT NULL,
+            UltimaVisita TEXT, PRIMARY KEY (Region, Comuna))''',
+        _rebuild_coverage,
+    ],
+    # 8: generación por tabla; cambia con cada borrado o reemplazo de filas
+    [
+        '''CREATE TABLE generaciones
+           (Tabla TEXT PRIMARY KEY, Generacion INTEGER NOT NULL DEFAULT 0)''',
+    ] + [f"INSERT INTO generaciones (Tabla) VALUES ('{t}')" for t in SUPERVISION_TABLES],
+    # 9: versión de datos por tabla para la caché, incrementada en cada transacción de escritura
+    [
+        '''CREATE TABLE versiones
+           (Tabla TEXT PRIMARY KEY, Version INTEGER NOT NULL DEFAULT 0)''',
+    ],
+]
+
+LOCALES_MIGRATIONS = [
+    # 1: índice por código interno
+    [
+        _locales_indexes,
+    ],
+]
+
+# Cola de trabajos en un archivo propio: encolar no compite con las escrituras de datos
+JOBS_MIGRATIONS = [
+    # 1: trabajos de carga y aprobación
+    [
+        '''CREATE TABLE jobs
+           (id INTEGER PRIMARY KEY, Tipo TEXT NOT NULL, Estado TEXT NOT NULL, Parametros TEXT,
+            Resultado TEXT, Error TEXT, Creado TEXT, Iniciado TEXT, Terminado TEXT)''',
+        "CREATE INDEX idx_jobs_estado ON jobs (Estado, id)",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Pragmas aplicados a cada conexión nueva del pool
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,      # 64 MB de caché de páginas
+    "mmap_size": 268435456,    # 256 MB mapeados en memoria
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+# Serializa las escrituras entre las sesiones (hilos) de Streamlit
+_write_lock = threading.RLock()
+
+# Tiempos de consulta por hilo, es decir, por sesión/rerun de Streamlit
+_query_stats = threading.local()
+
+def _set_pragmas(dbapi_connection, connection_record):
+    # El BEGIN lo emite _begin para que también el DDL sea transaccional
+    dbapi_connection.isolation_level = None
+    cur = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cur.execute(f"PRAGMA {pragma}={value}")
+    cur.close()
+
+def _attach_locales(dbapi_connection, connection_record):
+    # locales_db.db queda disponible como "loc" en las conexiones de supervisiones.db
+    dbapi_connection.execute("ATTACH DATABASE ? AS loc", (LOCALES_DB_NAME,))
+
+def _begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _record_query(db_name, statement, rows, elapsed):
+    stats = getattr(_query_stats, "queries", None)
+    if stats is None:
+        stats = _query_stats.queries = []
+    stats.append({
+        "db": os.path.basename(db_name),
+        "query": " ".join(statement.split())[:120],
+        "rows": rows,
+        "ms": elapsed * 1000,
+    })
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    # Las lecturas con _read_sql se registran completas (ejecución + fetch)
+    if statement != "BEGIN" and not getattr(_query_stats, "reading", False):
+        _record_query(conn.engine.url.database, statement, cursor.rowcount, elapsed)
+
+def get_engine(db_name=None):
+    # Un único engine con pool de conexiones por archivo de base de datos
+    db_name = db_name or DB_NAME
+    engine = _engines.get(db_name)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(db_name)
+            if engine is None:
+                engine = create_engine(f'sqlite:///{db_name}', poolclass=QueuePool,
+                                       pool_size=5, max_overflow=10,
+                                       connect_args={"check_same_thread": False, "timeout": 30})
+                event.listen(engine, "connect", _set_pragmas)
+                if db_name not in (LOCALES_DB_NAME, JOBS_DB_NAME):
+                    event.listen(engine, "connect", _attach_locales)
+                event.listen(engine, "begin", _begin)
+                event.listen(engine, "before_cursor_execute", _before_execute)
+                event.listen(engine, "after_cursor_execute", _after_execute)
+                _engines[db_name] = engine
+    return engine
+
+def get_query_stats():
+    return list(getattr(_query_stats, "queries", []))
+
+def reset_query_stats():
+    _query_stats.queries = []
+
+def get_schema_version(db_name=None):
+    with get_engine(db_name).connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def _apply_migrations(db_name, migrations):
+    # Aplicar las migraciones pendientes, cada una en su propia transacción
+    version = get_schema_version(db_name)
+    for number, statements in enumerate(migrations[version:], start=version + 1):
+        with get_engine(db_name).begin() as conn:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+        print(f"Migración {number} aplicada a {db_name}.")
+    return get_schema_version(db_name)
+
+def migrate():
+    with _write_lock:
+        version = _apply_migrations(DB_NAME, MIGRATIONS)
+        _apply_migrations(LOCALES_DB_NAME, LOCALES_MIGRATIONS)
+        _apply_migrations(JOBS_DB_NAME, JOBS_MIGRATIONS)
+        with get_engine().begin() as conn:
+            _bump_versions(conn, *SUPERVISION_TABLES, "locales", "locales_status", "metas")
+    return version
+
+def ensure_schema():
+    # Comprobación barata para el arranque de la app: solo migra si hace falta
+    if (get_schema_version() < SCHEMA_VERSION
+            or get_schema_version(LOCALES_DB_NAME) < len(LOCALES_MIGRATIONS)
+            or get_schema_version(JOBS_DB_NAME) < len(JOBS_MIGRATIONS)):
+        migrate()
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def seed_from_workbooks(force=False, directory="."):
+    # Importar los libros Excel solo si su contenido cambió desde la última vez
+    imported = []
+    for workbook, table in SEED_WORKBOOKS.items():
+        path = os.path.join(directory, workbook)
+        if not os.path.exists(path):
+            continue
+        db_name = LOCALES_DB_NAME if table == "locales" else DB_NAME
+        sha256 = _file_sha256(path)
+        with get_engine().connect() as conn:
+            previous = conn.exec_driver_sql("SELECT Sha256 FROM seed_state WHERE Archivo = ?",
+                                            (workbook,)).scalar()
+        if previous == sha256 and not force:
+            continue
+        df = pd.read_excel(path)
+        with _write_lock:
+            if table == "locales":
+                save_locales_db(df)
+            else:
+                _save_table(table, df)
+            with get_engine().begin() as conn:
+                conn.exec_driver_sql("INSERT OR REPLACE INTO seed_state VALUES (?, ?, ?)",
+                                     (workbook, sha256, datetime.now().isoformat(timespec="seconds")))
+        print(f"Datos de {workbook} copiados a la tabla {table} de {db_name}.")
+        imported.append(workbook)
+    return imported
+
+def init_db(force=False, directory="."):
+    # Migración y carga inicial; se ejecuta con `python manage.py init-db`
+    migrate()
+    return seed_from_workbooks(force=force, directory=directory)
+
+def _read_sql(sql, db_name=None, params=None):
+    start = time.perf_counter()
+    _query_stats.reading = True
+    try:
+        df = pd.read_sql_query(sql, get_engine(db_name), params=params)
+    finally:
+        _query_stats.reading = False
+    _record_query(db_name or DB_NAME, sql, len(df), time.perf_counter() - start)
     return df
 
-def load_temp_database():
-    engine = create_engine(f'sqlite:///{DB_NAME}')
-    df = pd.read_sql_table('temp_database', engine)
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
+def _load_table(table):
+    df = _read_sql(f'SELECT {", ".join(TABLE_COLUMNS[table])} FROM {table}')
+    df["Fecha"] = pd.to_datetime(df["Fecha"], format='ISO8601')
     df["Codigo_Interno"] = df["Codigo_Interno"].astype(str)
     return df
 
+def _save_table(table, df):
+    # Reemplaza el contenido conservando el esquema tipado y los índices
+    columns = [c for c in TABLE_COLUMNS[table] if c in df.columns]
+    rows = _prepare_rows(df, columns)
+    placeholders = ", ".join("?" for _ in columns)
+    with _write_lock, get_engine().begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM {table}")
+        _bump_generation(conn, table)
+        if rows:
+            conn.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        # Un reemplazo completo puede quitar estados: recalcular la tabla materializada
+        for statement in LOCALES_STATUS_REBUILD:
+            conn.exec_driver_sql(statement)
+        _rebuild_coverage(conn)
+        _rebuild_fingerprints(conn)
+        _bump_versions(conn, table, "locales_status")
+
+def _bump_versions(conn, *tables):
+    # Dentro de la transacción de escritura: la versión cambia junto con los datos,
+    # y una transacción sin confirmar no invalida la caché de nadie
+    conn.exec_driver_sql('''INSERT INTO versiones (Tabla, Version) VALUES (?, 1)
+                            ON CONFLICT (Tabla) DO UPDATE SET Version = Version + 1''',
+                         [(table,) for table in sorted(set(tables))])
+
+def get_versions():
+    # Se leen por la conexión DB-API: no cuentan como consultas del rerun
+    connection = get_engine().raw_connection()
+    try:
+        return dict(connection.cursor().execute("SELECT Tabla, Version FROM versiones").fetchall())
+    except sqlite3.OperationalError:
+        # Base sin la migración 9
+        return {}
+    finally:
+        connection.close()
+
+def _data_versions(tables):
+    # Clave de la caché: archivos en uso y versión de cada tabla
+    versions = get_versions()
+    return (DB_NAME, LOCALES_DB_NAME) + tuple(versions.get(table, 0) for table in tables)
+
+set_version_reader(_data_versions)
+
+def _bump_generation(conn, table):
+    # Los ids no son AUTOINCREMENT: tras un borrado o reemplazo pueden repetirse,
+    # así que (filas, id máximo) no basta para detectar el cambio
+    conn.exec_driver_sql("UPDATE generaciones SET Generacion = Generacion + 1 WHERE Tabla = ?", (table,))
+
+def get_table_state(table):
+    # (filas, id máximo, generación): si solo crecen filas e id, hubo solo inserciones
+    with get_engine().connect() as conn:
+        return tuple(conn.exec_driver_sql(f'''SELECT COUNT(*), COALESCE(MAX(id), 0),
+                                                (SELECT Generacion FROM generaciones WHERE Tabla = ?)
+                                         FROM {table}''', (table,)).one())
+
+def _db_file():
+    return DB_NAME
+
+def _locales_db_file():
+    return LOCALES_DB_NAME
+
+@cached(["main_database"])
+@profiled
+def load_main_database():
+    return _load_table('main_database')
+
+@cached(["temp_database"])
+@profiled
+def load_temp_database():
+    return _load_table('temp_database')
+
+@profiled
 def save_temp_database(df):
-    engine = create_engine(f'sqlite:///{DB_NAME}')
-    df["Fecha"] = df["Fecha"].dt.strftime('%Y-%m-%d')
-    df["Codigo_Interno"] = df["Codigo_Interno"].astype(str)
-    df.to_sql('temp_database', engine, if_exists='replace', index=False)
+    _save_table('temp_database', df)
 
+@profiled
 def save_main_database(df):
-    engine = create_engine(f'sqlite:///{DB_NAME}')
-    df["Fecha"] = df["Fecha"].dt.strftime('%Y-%m-%d')
-    df["Codigo_Interno"] = df["Codigo_Interno"].astype(str)
-    df.to_sql('main_database', engine, if_exists='replace', index=False)
+    _save_table('main_database', df)
 
+@cached(["locales"])
+@profiled
 def load_locales_db():
-    engine = create_engine(f'sqlite:///{LOCALES_DB_NAME}')
-    df = pd.read_sql_table('locales', engine)
+    df = _read_sql('SELECT * FROM locales', LOCALES_DB_NAME)
     df['Código interno'] = df['Código interno'].astype(str)
     return df
 
+@profiled
 def save_locales_db(df):
-    engine = create_engine(f'sqlite:///{LOCALES_DB_NAME}')
     df['Código interno'] = df['Código interno'].astype(str)
-    df.to_sql('locales', engine, if_exists='replace', index=False)
-
-def load_locations_to_supervise(main_db):
-    locales_db = load_locales_db()
-    
-    # Ordenar main_db por fecha y obtener el último estado para cada Codigo_Interno
-    latest_status = main_db.sort_values('Fecha').groupby('Codigo_Interno').last()
-    
-    # Mapear el estado de supervisión más reciente a los locales
-    locales_db['Estado_Supervision'] = locales_db['Código interno'].map(latest_status['Estado_Supervision'])
-    locales_db['Estado_Supervision'] = locales_db['Estado_Supervision'].fillna('Disponible')
-    
-    return locales_db
+    with _write_lock:
+        df.to_sql('locales', get_engine(LOCALES_DB_NAME), if_exists='replace', index=False)
+        with get_engine(LOCALES_DB_NAME).begin() as conn:
+            _locales_indexes(conn)
+        # Locales nuevos o reubicados: el índice de cobertura se recalcula completo
+        with get_engine().begin() as conn:
+            _rebuild_coverage(conn)
+            _bump_versions(conn, "locales")
 
-def load_inconsistencias():
-    engine = create_engine(f'sqlite:///{DB_NAME}')
-    df = pd.read_sql_table('inconsistencias', engine)
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
-    df["Codigo_Interno"] = df["Codigo_Interno"].astype(str)
+@contextmanager
+def write_transaction(tables=SUPERVISION_TABLES):
+    # Varias escrituras en una sola transacción; las versiones de caché se
+    # incrementan en la misma transacción y se ven recién con el commit
+    with _write_lock, get_engine().begin() as conn:
+        yield conn
+        _bump_versions(conn, *tables, "locales_status")
+
+@contextmanager
+def _using(conn=None):
+    # Reutiliza la transacción en curso para ver también sus filas sin confirmar
+    if conn is not None:
+        yield conn
+    else:
+        with get_engine().begin() as conn:
+            yield conn
+
+def find_existing_codes(codes, conn=None):
+    # Códigos ya presentes en alguna tabla, resueltos con los índices por código
+    codes = [(code,) for code in pd.unique(pd.Series(codes, dtype=object).astype(str))]
+    if not codes:
+        return set()
+    exists = " OR ".join(f"EXISTS (SELECT 1 FROM {t} WHERE {t}.Codigo_Interno = c.Codigo_Interno)"
+                         for t in SUPERVISION_TABLES)
+    with _using(conn) as conn:
+        conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS codigos_consulta (Codigo_Interno TEXT PRIMARY KEY)")
+        conn.exec_driver_sql("DELETE FROM temp.codigos_consulta")
+        conn.exec_driver_sql("INSERT OR IGNORE INTO temp.codigos_consulta VALUES (?)", codes)
+        result = conn.exec_driver_sql(f"SELECT Codigo_Interno FROM temp.codigos_consulta c WHERE {exists}")
+        return {row[0] for row in result}
+
+def find_existing_fingerprints(fingerprints, conn=None):
+    # Huellas ya registradas, resueltas por clave primaria
+    fingerprints = [(fp,) for fp in set(fingerprints)]
+    if not fingerprints:
+        return set()
+    with _using(conn) as conn:
+        conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS huellas_consulta (Huella INTEGER PRIMARY KEY)")
+        conn.exec_driver_sql("DELETE FROM temp.huellas_consulta")
+        conn.exec_driver_sql("INSERT OR IGNORE INTO temp.huellas_consulta VALUES (?)", fingerprints)
+        result = conn.exec_driver_sql("SELECT h.Huella FROM temp.huellas_consulta h JOIN main.huellas USING (Huella)")
+        return {row[0] for row in result}
+
+@profiled
+def classify_records(df, conn=None):
+    # Separa una carga en nuevos, duplicados exactos y conflictos con solo
+    # consultas indexadas por las filas de la carga
+    fingerprints = _fingerprint_rows(_prepare_rows(df))
+    return dedup.classify(df, fingerprints, find_existing_fingerprints(fingerprints, conn),
+                          find_existing_codes(df["Codigo_Interno"], conn))
+
+# Locales con su último estado: join entre loc.locales y locales_status
+LOCALES_WITH_STATUS = '''SELECT l.*, COALESCE(s.Estado_Supervision, 'Disponible') AS Estado_Supervision
+                         FROM loc.locales AS l
+                         LEFT JOIN locales_status AS s ON s.Codigo_Interno = CAST(l."Código interno" AS TEXT)'''
+
+@cached(["locales", "locales_status"])
+@profiled
+def load_locations_to_supervise():
+    df = _read_sql(LOCALES_WITH_STATUS)
+    df['Código interno'] = df['Código interno'].astype(str)
     return df
 
+@cached(["locales", "locales_status"])
+@profiled
+def load_locales_coverage():
+    # Cantidad de locales por estado, sumada desde el índice de cobertura
+    sums = ", ".join(f"COALESCE(SUM({column}), 0) AS \"{status}\"" for status, column in COVERAGE_STATUSES.items())
+    return _read_sql(f"SELECT {sums} FROM cobertura").iloc[0].rename("Cantidad")
+
+def _coverage_columns():
+    # Porcentaje fiscalizado y días desde la última visita, calculados al consultar
+    return '''Region, Comuna, Total, Fiscalizados, Prefiscalizados, Disponibles, UltimaVisita,
+              ROUND(100.0 * Fiscalizados / MAX(Total, 1), 2) AS Cobertura,
+              CAST(julianday('now', 'localtime', 'start of day') - julianday(UltimaVisita) AS INTEGER) AS Dias_Sin_Visita'''
+
+@cached(["locales", "locales_status"])
+@profiled
+def load_coverage_by_region():
+    # Primer nivel del índice: totales por región
+    return _read_sql('''SELECT Region, COUNT(*) AS Comunas, SUM(Total) AS Total, SUM(Fiscalizados) AS Fiscalizados,
+                               SUM(Prefiscalizados) AS Prefiscalizados, SUM(Disponibles) AS Disponibles,
+                               MAX(UltimaVisita) AS UltimaVisita,
+                               ROUND(100.0 * SUM(Fiscalizados) / MAX(SUM(Total), 1), 2) AS Cobertura,
+                               CAST(julianday('now', 'localtime', 'start of day') - julianday(MAX(UltimaVisita))
+                                    AS INTEGER) AS Dias_Sin_Visita
+                        FROM cobertura GROUP BY Region ORDER BY Region''')
+
+@cached(["locales", "locales_status"])
+@profiled
+def load_coverage_comunas(region=None):
+    # Detalle por comuna, de una región (clave primaria) o de todas
+    where, params = ("WHERE Region = ?", (region,)) if region is not None else ("", ())
+    return _read_sql(f"SELECT {_coverage_columns()} FROM cobertura {where} ORDER BY Region, Comuna", params=params)
+
+@cached(["locales", "locales_status"])
+@profiled
+def rank_undercovered_comunas(limit=20, region=None, min_locales=1):
+    # Comunas con menor porcentaje fiscalizado; a igual cobertura, las de más
+    # disponibles y luego las visitadas hace más tiempo (o nunca)
+    conditions, params = ["Total >= ?"], [min_locales]
+    if region is not None:
+        conditions.append("Region = ?")
+        params.append(region)
+    return _read_sql(f'''SELECT {_coverage_columns()} FROM cobertura WHERE {' AND '.join(conditions)}
+                         ORDER BY Cobertura, Disponibles DESC, UltimaVisita IS NOT NULL, UltimaVisita LIMIT ?''',
+                     params=tuple(params) + (limit,))
+
+@cached(["locales", "locales_status"])
+@profiled
+def load_locales_coverage_by_area():
+    # Estados por región y comuna, desde el índice de cobertura
+    return _read_sql('''SELECT Region, Comuna, Total, Fiscalizados, Prefiscalizados, Disponibles
+                        FROM cobertura ORDER BY Region, Comuna''')
+
+def available_locales_query(region=None, comuna=None):
+    # Locales disponibles, opcionalmente por región y comuna
+    conditions, params = ["Estado_Supervision = 'Disponible'"], []
+    if region is not None:
+        conditions.append('"Región" = ?')
+        params.append(region)
+    if comuna is not None:
+        conditions.append("Comuna = ?")
+        params.append(comuna)
+    return f"SELECT * FROM ({LOCALES_WITH_STATUS}) WHERE {' AND '.join(conditions)}", tuple(params)
+
+@cached(["inconsistencias"])
+@profiled
+def load_inconsistencias():
+    return _load_table('inconsistencias')
+
+@profiled
 def save_inconsistencias(df):
-    engine = create_engine(f'sqlite:///{DB_NAME}')
-    df["Fecha"] = df["Fecha"].dt.strftime('%Y-%m-%d')
-    df["Codigo_Interno"] = df["Codigo_Interno"].astype(str)
-    df.to_sql('inconsistencias', engine, if_exists='replace', index=False)
+    _save_table('inconsistencias', df)
 
-def load_all_data():
-    main_db = load_main_database()
-    temp_db = load_temp_database()
-    inconsistencias_db = load_inconsistencias()
-    return pd.concat([main_db, temp_db, inconsistencias_db]).drop_duplicates(subset=["Codigo_Interno", "Fecha"], keep="last")
+@cached(["metas"])
+@profiled
+def load_metas():
+    return _read_sql("SELECT Anio, Mes, Region, Meta FROM metas")
+
+@profiled
+def save_metas(df):
+    # Inserta o reemplaza metas por (año, mes, región); el resto se conserva
+    rows = [(int(anio), str(mes), str(region), int(meta))
+            for anio, mes, region, meta in df[["Anio", "Mes", "Region", "Meta"]].itertuples(index=False)]
+    with _write_lock, get_engine().begin() as conn:
+        conn.exec_driver_sql('''INSERT INTO metas (Anio, Mes, Region, Meta) VALUES (?, ?, ?, ?)
+                                ON CONFLICT (Anio, Mes, Region) DO UPDATE SET Meta = excluded.Meta''', rows)
+        _bump_versions(conn, "metas")
+    return len(rows)
+
+def _prepare_rows(df, columns=COLUMNS):
+    # Normalizar al formato almacenado y convertir NaN/NaT en NULL
+    rows = df[columns].copy()
+    rows["Fecha"] = pd.to_datetime(rows["Fecha"]).dt.strftime('%Y-%m-%d')
+    rows["Codigo_Interno"] = rows["Codigo_Interno"].astype(str)
+    rows = rows.astype(object).where(rows.notna(), None)
+    return list(rows.itertuples(index=False, name=None))
+
+def _refresh_locales_status(conn, codes):
+    # Solo se tocan los códigos del lote, recalculados con la misma consulta que la
+    # reconstrucción completa; así ambos caminos resuelven igual los empates de fecha
+    codes = [(code,) for code in set(codes) if code is not None]
+    if not codes:
+        return
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS estado_lote (Codigo_Interno TEXT PRIMARY KEY)")
+    conn.exec_driver_sql("DELETE FROM temp.estado_lote")
+    conn.exec_driver_sql("INSERT INTO temp.estado_lote VALUES (?)", codes)
+    # Cobertura: se leen los estados de los locales del lote antes y después
+    before = _coverage_states(conn)
+    conn.exec_driver_sql("DELETE FROM locales_status WHERE Codigo_Interno IN "
+                         "(SELECT Codigo_Interno FROM temp.estado_lote)")
+    conn.exec_driver_sql("INSERT INTO locales_status (Codigo_Interno, Estado_Supervision, Fecha) "
+                         + _latest_status_sql(_STATUS_BATCH_WHERE))
+    _update_coverage(conn, before, _coverage_states(conn))
+
+def _append_rows(table, df, conn=None):
+    # Insertar solo las filas nuevas en una única transacción, o dentro de la
+    # transacción recibida (write_transaction)
+    if df.empty:
+        return 0
+    if conn is None:
+        with write_transaction((table,)) as conn:
+            return _append_rows(table, df, conn)
+    columns = COLUMNS + [c for c in TABLE_COLUMNS[table] if c not in COLUMNS and c in df.columns]
+    rows = _prepare_rows(df, columns)
+    placeholders = ", ".join("?" for _ in columns)
+    conn.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+    _refresh_locales_status(conn, [row[COLUMNS.index("Codigo_Interno")] for row in rows])
+    _add_fingerprints(conn, rows)
+    return len(rows)
+
+@profiled
+def append_temp_database(df, conn=None):
+    return _append_rows('temp_database', df, conn)
 
-# Inicializar la base de datos
-init_db()
\ No newline at end of file
+@profiled
+def append_main_database(df, conn=None):
+    return _append_rows('main_database', df, conn)
+
+@profiled
+def append_inconsistencias(df, conn=None):
+    return _append_rows('inconsistencias', df, conn)
+
+@profiled
+def approve_temp_records(codes):
+    # Mover los registros aprobados de temp_database a main_database con
+    # INSERT ... SELECT + DELETE dentro de la misma transacción
+    columns = ", ".join(COLUMNS)
+    codes = [(str(code),) for code in codes]
+    with _write_lock, get_engine().begin() as conn:
+        conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS aprobados (Codigo_Interno TEXT PRIMARY KEY)")
+        conn.exec_driver_sql("DELETE FROM temp.aprobados")
+        if codes:
+            conn.exec_driver_sql("INSERT OR IGNORE INTO temp.aprobados VALUES (?)", codes)
+        moved = conn.exec_driver_sql(f'''INSERT INTO main_database ({columns}, Aprobado)
+                                        SELECT {columns}, 1 FROM temp_database
+                                        WHERE Codigo_Interno IN (SELECT Codigo_Interno FROM temp.aprobados)''').rowcount
+        conn.exec_driver_sql('''DELETE FROM temp_database
+                                WHERE Codigo_Interno IN (SELECT Codigo_Interno FROM temp.aprobados)''')
+        _bump_generation(conn, "temp_database")
+        # Las filas movidas cambian de tabla e id: puede cambiar el desempate
+        _refresh_locales_status(conn, [code for (code,) in codes])
+        _bump_versions(conn, "main_database", "temp_database", "locales_status")
+    return moved
+
+def _where_clause(supervisors=(), regions=(), start_date=None, end_date=None, month=None):
+    conditions, params = [], []
+    if supervisors:
+        conditions.append(f"Nombre_Supervisor IN ({', '.join('?' for _ in supervisors)})")
+        params.extend(supervisors)
+    if regions:
+        conditions.append(f"Region IN ({', '.join('?' for _ in regions)})")
+        params.extend(regions)
+    if start_date is not None:
+        conditions.append("Fecha >= ?")
+        params.append(pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+    if end_date is not None:
+        conditions.append("Fecha <= ?")
+        params.append(pd.Timestamp(end_date).strftime('%Y-%m-%d'))
+    if month is not None and month != "Total":
+        conditions.append("Mes = ?")
+        params.append(month)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), tuple(params)
+
+def typed_supervisiones(df):
+    # Convierte en el lugar a los tipos compactos; el resultado queda en la caché
+    # del proceso y todas las sesiones reciben copias superficiales de solo lectura
+    df["Fecha"] = pd.to_datetime(df["Fecha"], format='ISO8601')
+    df["Codigo_Interno"] = df["Codigo_Interno"].astype(CODE_DTYPE)
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype(MONTH_DTYPE if column == "Mes" else "category")
+    if "Aprobado" in df.columns:
+        df["Aprobado"] = df["Aprobado"].astype("Int8")
+    return df
+
+@cached(SUPERVISION_TABLES)
+@profiled
+def query_supervisiones(supervisors=(), regions=(), start_date=None, end_date=None):
+    sql, params = supervisiones_query(supervisors, regions, start_date, end_date)
+    return typed_supervisiones(_read_sql(sql, params=params))
+
+def supervisiones_query(supervisors=(), regions=(), start_date=None, end_date=None, month=None):
+    # Filtros del sidebar resueltos en SQL sobre la vista unificada e indexada
+    where, params = _where_clause(supervisors, regions, start_date, end_date, month)
+    return f"SELECT {', '.join(COLUMNS)}, Aprobado FROM supervisiones{where}", params
+
+def iter_sql_chunks(sql, params=(), db_name=None, chunksize=50_000):
+    # Resultado de una consulta por bloques, sin materializarlo completo
+    start, rows = time.perf_counter(), 0
+    with get_engine(db_name).connect() as conn:
+        _query_stats.reading = True
+        try:
+            for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize):
+                rows += len(chunk)
+                yield chunk
+        finally:
+            _query_stats.reading = False
+    _record_query(db_name or DB_NAME, sql, rows, time.perf_counter() - start)
+
+@cached(SUPERVISION_TABLES)
+@profiled
+def load_filter_options():
+    # Valores disponibles para los filtros con consultas DISTINCT/MIN/MAX sobre índices
+    def distinct(column):
+        union = " UNION ".join(f"SELECT {column} FROM {t}" for t in SUPERVISION_TABLES)
+        rows = _read_sql(f"SELECT {column} FROM ({union}) WHERE {column} IS NOT NULL ORDER BY {column}")
+        return rows[column].tolist()
+
+    dates = " UNION ALL ".join(f"SELECT MIN(Fecha) AS min_fecha, MAX(Fecha) AS max_fecha FROM {t}"
+                               for t in SUPERVISION_TABLES)
+    bounds = _read_sql(f"SELECT MIN(min_fecha) AS min_fecha, MAX(max_fecha) AS max_fecha FROM ({dates})")
+    return {
+        "supervisors": distinct("Nombre_Supervisor"),
+        "regions": distinct("Region"),
+        "min_date": pd.to_datetime(bounds["min_fecha"].iloc[0]),
+        "max_date": pd.to_datetime(bounds["max_fecha"].iloc[0]),
+    }
+
+def load_all_data():
+    return query_supervisiones()
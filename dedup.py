@@ -0,0 +1,34 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Campos que identifican una supervisión: dos filas con la misma huella son la misma visita
+FINGERPRINT_COLUMNS = ["Codigo_Interno", "Fecha", "Tipo_Fiscalizacion", "Nombre_Supervisor"]
+
+# Motivos con los que se guardan los conflictos en inconsistencias
+MOTIVO_CODIGO_EXISTENTE = "codigo_existente"
+MOTIVO_CODIGO_REPETIDO = "codigo_repetido_en_carga"
+
+def fingerprint(values):
+    # Entero de 64 bits estable entre procesos (a diferencia de hash())
+    key = "\x1f".join("" if value is None else str(value) for value in values)
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+def classify(df, fingerprints, existing_fingerprints, existing_codes):
+    # Cada fila es nueva, duplicado exacto (huella ya vista en la base o antes en la
+    # carga) o conflicto (mismo código con otra fecha, tipo o supervisor)
+    fingerprints = pd.Series(fingerprints)
+    codes = pd.Series(df["Codigo_Interno"].astype(str).to_numpy())
+    exact = (fingerprints.isin(existing_fingerprints) | fingerprints.duplicated()).to_numpy()
+    in_history = ~exact & codes.isin(existing_codes).to_numpy()
+    in_batch = ~exact & ~in_history & codes.duplicated().to_numpy()
+
+    conflicts = df[in_history | in_batch].copy()
+    conflicts["Motivo"] = np.where(in_history[in_history | in_batch], MOTIVO_CODIGO_EXISTENTE,
+                                   MOTIVO_CODIGO_REPETIDO)
+    return {
+        "nuevos": df[~(exact | in_history | in_batch)],
+        "conflictos": conflicts,
+        "duplicados": int(exact.sum()),
+    }
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import database
+
+# Exportaciones escritas en disco bloque a bloque desde SQL; una exportación con
+# la misma consulta y los mismos datos se reutiliza
+EXPORT_DIR = "exportaciones"
+EXPORT_CHUNK_SIZE = 50_000
+
+# Formato -> tipo MIME para st.download_button
+FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Filas por hoja en Excel (el límite es 1.048.576 incluyendo el encabezado)
+XLSX_SHEET_ROWS = 1_000_000
+
+def _export_path(name, sql, params, fmt):
+    # El nombre incluye la consulta y las versiones de datos: cambia con cada escritura
+    signature = (sql, tuple(params), database.DB_NAME, database.LOCALES_DB_NAME, sorted(database.get_versions().items()))
+    digest = hashlib.blake2b(repr(signature).encode(), digest_size=8).hexdigest()
+    return os.path.join(EXPORT_DIR, f"{name}_{digest}.{fmt}")
+
+def _write_csv(chunks, path):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        for number, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=number == 0)
+
+def _write_xlsx(chunks, path):
+    # Libro en modo write_only: openpyxl no guarda las celdas ya escritas
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, columns = None, 0, None
+    for chunk in chunks:
+        columns = list(chunk.columns)
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+            if sheet is None or sheet_rows == XLSX_SHEET_ROWS:
+                sheet = workbook.create_sheet(f"Datos {len(workbook.worksheets) + 1}")
+                sheet.append(columns)
+                sheet_rows = 0
+            sheet.append(list(row))
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet("Datos 1").append(columns or [])
+    workbook.save(path)
+
+def _write_parquet(chunks, path):
+    # El esquema sale del primer bloque; columnas sin valores en él quedan como texto
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                                    for f in table.schema])
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx, "parquet": _write_parquet}
+
+def export_query(name, sql, params=(), fmt="csv", db_name=None, chunksize=EXPORT_CHUNK_SIZE):
+    # Devuelve la ruta del archivo exportado; en memoria solo hay un bloque a la vez
+    if fmt not in WRITERS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = _export_path(name, sql, params, fmt)
+    if os.path.exists(path):
+        return path
+    # Se escribe con otro nombre y se renombra: una descarga nunca ve un archivo a medias
+    partial = f"{path}.{os.getpid()}-{threading.get_ident()}.parcial"
+    WRITERS[fmt](database.iter_sql_chunks(sql, params, db_name, chunksize), partial)
+    os.replace(partial, path)
+    _remove_stale(name, path)
+    return path
+
+def _remove_stale(name, current):
+    # Versiones anteriores de la misma exportación
+    for file_name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, file_name)
+        if path != current and file_name.startswith(name + "_") and not file_name.endswith(".parcial"):
+            if os.path.splitext(file_name)[1] == os.path.splitext(current)[1]:
+                os.remove(path)
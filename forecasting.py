@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import database
+from cache import cached
+from normalization import MESES_CALENDARIO
+
+# Modelos de proyección: ritmo diario promedio o tendencia lineal (mínimos cuadrados)
+MODELS = {"ritmo": "Ritmo diario promedio", "tendencia": "Tendencia lineal"}
+INTERVAL_LEVEL = 0.9
+# Visitas a priori repartidas en los días transcurridos (piso de la varianza)
+PSEUDO_COUNT = 1
+
+FORECAST_COLUMNS = ["Fiscalizados", "Ritmo_Diario", "Proyeccion", "Inferior", "Superior", "Desviacion",
+                    "Grados_Libertad", "Dias_Restantes"]
+
+def month_bounds(year, month):
+    start = pd.Timestamp(year=int(year), month=int(MESES_CALENDARIO.get_loc(month)) + 1, day=1)
+    return start, start + pd.offsets.MonthEnd(0)
+
+def daily_counts(data, by, start, end):
+    # Matriz grupos x días con los fiscalizados de cada día, con un solo groupby
+    fiscalized = data[data["Estado_Supervision"] == "Fiscalizado"]
+    days = pd.date_range(start, end, freq="D")
+    counts = fiscalized.groupby([fiscalized[by].astype(str), fiscalized["Fecha"].dt.normalize()]).size()
+    return counts.unstack(fill_value=0).reindex(columns=days, fill_value=0)
+
+def _variance_floor(counts):
+    # Conteos diarios: la varianza no baja de la de Poisson con el ritmo observado
+    # más PSEUDO_COUNT; sin esto, días iguales darían un intervalo de ancho cero
+    return (counts.sum(axis=1) + PSEUDO_COUNT) / counts.shape[1]
+
+def _run_rate(counts, remaining):
+    # Promedio diario; la varianza suma la de los días que faltan y la del promedio
+    elapsed = counts.shape[1]
+    rate = counts.mean(axis=1)
+    variance = counts.var(axis=1, ddof=1) if elapsed > 1 else np.zeros(len(counts))
+    variance = np.maximum(variance, _variance_floor(counts))
+    expected = rate * remaining
+    spread = np.sqrt(variance * (remaining + remaining ** 2 / elapsed))
+    return rate, expected, spread, elapsed - 1
+
+def _trend(counts, remaining):
+    # Recta por grupo, ajustada para todas las filas a la vez
+    elapsed = counts.shape[1]
+    t = np.arange(elapsed, dtype=float)
+    t_mean, sxx = t.mean(), ((t - t.mean()) ** 2).sum()
+    y_mean = counts.mean(axis=1)
+    if elapsed < 3:
+        return _run_rate(counts, remaining)
+    slope = ((counts - y_mean[:, None]) * (t - t_mean)).sum(axis=1) / sxx
+    intercept = y_mean - slope * t_mean
+    residuals = counts - (intercept[:, None] + slope[:, None] * t)
+    variance = np.maximum((residuals ** 2).sum(axis=1) / (elapsed - 2), _variance_floor(counts))
+
+    future = np.arange(elapsed, elapsed + remaining, dtype=float)
+    # Días futuros con predicción negativa no restan: se recorta cada día en cero
+    expected = np.clip(intercept[:, None] + slope[:, None] * future, 0, None).sum(axis=1)
+    offset = (future - t_mean).sum()
+    spread = np.sqrt(variance * (remaining + remaining ** 2 / elapsed + offset ** 2 / sxx))
+    rate = np.clip(intercept + slope * (elapsed - 1), 0, None)
+    return rate, expected, spread, elapsed - 2
+
+@cached(database.SUPERVISION_TABLES)
+def forecast_month(year, month, by="Region", model="ritmo", level=INTERVAL_LEVEL, as_of=None):
+    # Proyección de fiscalizados al cierre del mes por región o supervisor, con
+    # los datos hasta as_of (por defecto, la última fecha cargada). Se recalcula
+    # solo cuando cambian las tablas de supervisión.
+    start, end = month_bounds(year, month)
+    if as_of is None:
+        as_of = database.load_filter_options()["max_date"]
+    as_of = min(pd.Timestamp(as_of).normalize(), end) if pd.notnull(as_of) else start - pd.Timedelta(days=1)
+    data = database.query_supervisiones(start_date=start, end_date=as_of) if as_of >= start else None
+    if data is None or data.empty:
+        return pd.DataFrame(columns=FORECAST_COLUMNS, index=pd.Index([], name=by))
+
+    daily = daily_counts(data, by, start, as_of)
+    counts = daily.to_numpy(dtype=float)
+    remaining = (end - as_of).days
+    rate, expected, spread, dof = (_trend if model == "tendencia" else _run_rate)(counts, remaining)
+    achieved = counts.sum(axis=1)
+    margin = stats.t.ppf(0.5 + level / 2, max(dof, 1)) * spread
+    forecast = pd.DataFrame({
+        "Fiscalizados": achieved.astype(int),
+        "Ritmo_Diario": rate.round(2),
+        "Proyeccion": achieved + expected,
+        "Inferior": achieved + np.clip(expected - margin, 0, None),
+        "Superior": achieved + expected + margin,
+        "Desviacion": spread,
+        "Grados_Libertad": max(dof, 1),
+        "Dias_Restantes": remaining,
+    }, index=daily.index.rename(by))
+    return forecast
+
+def attainment(forecast, goals):
+    # Cumplimiento proyectado contra las metas (Serie por región) y probabilidad
+    # de alcanzarlas según la distribución t de la proyección. Las regiones sin
+    # fiscalizados en el mes quedan con proyección cero y probabilidad sin datos (NaN).
+    without_data = ~goals.index.isin(forecast.index)
+    result = forecast.reindex(goals.index, fill_value=0)
+    result.loc[without_data, ["Inferior", "Superior", "Desviacion"]] = np.nan
+    result["Grados_Libertad"] = result["Grados_Libertad"].clip(lower=1)
+    spread, missing = result["Desviacion"].to_numpy(float), (goals - result["Proyeccion"]).to_numpy(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probability = np.where(spread > 0, stats.t.sf(missing / spread, result["Grados_Libertad"]),
+                               (missing <= 0).astype(float))
+    result["Meta"] = goals.astype(int)
+    for column in ("Proyeccion", "Inferior", "Superior"):
+        result[f"{column}_%"] = np.divide(result[column] * 100, goals, out=np.zeros(len(goals)),
+                                          where=goals.to_numpy() > 0).round(1)
+    # Meta ya alcanzada con lo fiscalizado: probabilidad 1
+    probability = np.where(result["Fiscalizados"] >= goals, 1.0, probability)
+    probability = np.where(without_data, np.nan, probability)
+    result["Probabilidad_Meta"] = np.where(goals.to_numpy() > 0, probability, np.nan).round(3)
+    return result
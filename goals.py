@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+import database
+from cache import cached
+from config import REGIONS
+from normalization import MESES_CALENDARIO
+
+@cached(["metas"])
+def load_goal_matrix(regions=tuple(REGIONS)):
+    # Matriz regiones x periodos (año, mes) construida una vez por versión de metas
+    metas = database.load_metas()
+    region_index = pd.Index(regions)
+    periods = metas[["Anio", "Mes"]].drop_duplicates()
+    periods = periods.assign(orden=MESES_CALENDARIO.get_indexer(periods["Mes"])).sort_values(["Anio", "orden"])
+    period_index = pd.MultiIndex.from_frame(periods[["Anio", "Mes"]])
+
+    rows = region_index.get_indexer(metas["Region"])
+    columns = period_index.get_indexer(pd.MultiIndex.from_frame(metas[["Anio", "Mes"]]))
+    known = rows >= 0
+    matrix = np.zeros((len(region_index), len(period_index)), dtype=np.int64)
+    np.add.at(matrix, (rows[known], columns[known]), metas["Meta"].to_numpy()[known])
+    return {"regions": region_index, "periods": period_index, "matrix": matrix}
+
+def goal_years(goals):
+    return sorted(goals["periods"].get_level_values("Anio").unique().tolist())
+
+def goal_months(goals, year):
+    # Meses con metas del año, en orden de calendario
+    periods = goals["periods"]
+    return periods.get_level_values("Mes")[periods.get_level_values("Anio") == year].tolist()
+
+def period_mask(goals, year, month="Total"):
+    # Periodos incluidos en la selección: un mes o el año completo
+    periods = goals["periods"]
+    mask = periods.get_level_values("Anio") == year
+    if month != "Total":
+        mask &= periods.get_level_values("Mes") == month
+    return np.asarray(mask)
+
+def goals_by_region(goals, year, month="Total"):
+    return goals["matrix"][:, period_mask(goals, year, month)].sum(axis=1)
+
+def goals_table(goals, year):
+    # Metas del año como tabla regiones x meses para el mapa de calor
+    mask = period_mask(goals, year)
+    return pd.DataFrame(goals["matrix"][:, mask], index=goals["regions"],
+                        columns=goals["periods"].get_level_values("Mes")[mask])
+
+def goal_percentages(achieved, goal):
+    # Porcentaje de avance con tope de 100; 0 donde no hay meta
+    achieved = np.asarray(achieved, dtype=float)
+    goal = np.asarray(goal, dtype=float)
+    percentages = np.divide(achieved * 100, goal, out=np.zeros_like(achieved), where=goal > 0)
+    return np.minimum(percentages, 100)
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import database
+from profiling import profiled
+from data_processing import CHUNK_SIZE, SUPPORTED_EXTENSIONS, read_header, detect_data_type, iter_processed_chunks
+
+# Bloques normalizados de cada archivo en un Parquet temporal; el esquema fijo
+# evita que los índices de las categorías cambien de un bloque a otro
+STAGING_SCHEMA = pa.schema([
+    ("Fecha", pa.timestamp("ns")), ("Codigo_Interno", pa.string()),
+    ("Region", pa.dictionary(pa.int32(), pa.string())), ("Nombre_Supervisor", pa.dictionary(pa.int32(), pa.string())),
+    ("Estado_Supervision", pa.string()), ("Mes", pa.dictionary(pa.int32(), pa.string())),
+    ("Tipo_Fiscalizacion", pa.string()),
+])
+
+def expand_paths(paths):
+    # Carpetas se reemplazan por sus archivos de supervisión, en orden alfabético
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+@profiled
+def stage_file(path, data_type=None, directory="."):
+    # Se ejecuta en un proceso aparte: detecta el tipo, normaliza el archivo por
+    # bloques y los escribe en un Parquet temporal; nunca hay más de un bloque en memoria
+    data_type = data_type or detect_data_type(read_header(path))
+    unknown, discarded, rows, writer = {}, {"sin_codigo": 0, "sin_fecha": 0}, 0, None
+    staged = os.path.join(directory, f"{uuid.uuid4().hex}.parquet")
+    try:
+        for chunk in iter_processed_chunks(path, data_type, unknown=unknown, discarded=discarded):
+            if writer is None:
+                writer = pq.ParquetWriter(staged, STAGING_SCHEMA)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=STAGING_SCHEMA, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return (staged if writer is not None else None), data_type, unknown, rows, discarded
+
+def iter_staged_chunks(staged, chunksize=CHUNK_SIZE):
+    if staged is None:
+        return
+    for batch in pq.ParquetFile(staged).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+def stage_files(paths, data_type=None, workers=None, directory="."):
+    # Un proceso por archivo hasta agotar los núcleos; con un solo archivo o un
+    # solo núcleo se evita el costo de levantar procesos
+    workers = min(len(paths), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [stage_file(path, data_type, directory) for path in paths]
+    # spawn: el proceso de Streamlit tiene hilos y fork podría copiar locks tomados
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(stage_file, path, data_type, directory) for path in paths]
+        return [future.result() for future in futures]
+
+@profiled
+def ingest_files(paths, data_type=None, workers=None, progress=None, names=None):
+    # Lectura en paralelo a Parquet temporales y después una sola transacción
+    # para todo el lote, bloque a bloque: la deduplicación ve los bloques ya
+    # escritos (también de otros archivos) y el lote entra completo o no entra.
+    # progress recibe (filas escritas, filas del lote). Las filas sin código o
+    # sin fecha se descartan y se informan por archivo.
+    progress = progress or (lambda done, total: None)
+    summary = {"nuevos": 0, "conflictos": 0, "duplicados": 0, "archivos": {}, "desconocidos": {}}
+    with tempfile.TemporaryDirectory(prefix="ingesta_") as directory:
+        staged = stage_files(paths, data_type, workers, directory)
+        for name, (_, file_type, unknown, rows, discarded) in zip(names or paths, staged):
+            summary["archivos"][name] = {"tipo_datos": file_type, "filas": rows, **discarded}
+            for tipo, values in unknown.items():
+                summary["desconocidos"].setdefault(tipo, set()).update(values)
+        summary["desconocidos"] = {tipo: sorted(map(str, values))
+                                   for tipo, values in summary["desconocidos"].items() if values}
+
+        total, done = sum(rows for _, _, _, rows, _ in staged), 0
+        with database.write_transaction() as conn:
+            for path, _, _, _, _ in staged:
+                for chunk in iter_staged_chunks(path):
+                    if chunk.empty:
+                        continue
+                    records = database.classify_records(chunk, conn)
+                    summary["nuevos"] += database.append_temp_database(records["nuevos"], conn)
+                    summary["conflictos"] += database.append_inconsistencias(records["conflictos"], conn)
+                    summary["duplicados"] += records["duplicados"]
+                    done += len(chunk)
+                    progress(done, total)
+    return summary
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import traceback
+import uuid
+from datetime import datetime
+
+import database
+import snapshot
+from ingestion import ingest_files
+
+# Archivos subidos que esperan su turno en la cola
+STAGING_DIR = "trabajos"
+
+PENDIENTE, EN_CURSO, TERMINADO, ERROR = "pendiente", "en_curso", "terminado", "error"
+
+# Un único hilo ejecuta los trabajos en orden de llegada: las escrituras sobre las
+# tablas de supervisión nunca se cruzan y se confirman en el orden encolado
+_worker = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+
+# Avance del trabajo en curso (filas escritas, total). Vive en memoria porque la
+# transacción del trabajo retiene la escritura hasta el commit.
+_progress = {}
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def _engine():
+    return database.get_engine(database.JOBS_DB_NAME)
+
+def submit(kind, params):
+    with _engine().begin() as conn:
+        job_id = conn.exec_driver_sql(
+            "INSERT INTO jobs (Tipo, Estado, Parametros, Creado) VALUES (?, ?, ?, ?)",
+            (kind, PENDIENTE, json.dumps(params), _now())).lastrowid
+    start_worker()
+    _wake.set()
+    return job_id
+
+def submit_upload(files, data_type=None):
+    # Copia los archivos subidos a disco para procesarlos fuera del rerun;
+    # data_type None detecta el tipo de cada archivo por sus encabezados
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    staged = []
+    for file in files:
+        name = getattr(file, "name", "archivo")
+        path = os.path.join(STAGING_DIR, uuid.uuid4().hex + os.path.splitext(name)[1].lower())
+        with open(path, "wb") as f:
+            f.write(file.getvalue())
+        staged.append({"ruta": path, "archivo": name})
+    return submit("ingesta", {"archivos": staged, "tipo_datos": data_type})
+
+def submit_approval(codes):
+    return submit("aprobacion", {"codigos": [str(code) for code in codes]})
+
+def _row_to_job(row):
+    job = dict(row._mapping)
+    job["Parametros"] = json.loads(job["Parametros"]) if job["Parametros"] else {}
+    job["Resultado"] = json.loads(job["Resultado"]) if job["Resultado"] else None
+    job["Avance"] = _progress.get(job["id"])
+    return job
+
+def get_jobs(job_ids):
+    if not job_ids:
+        return []
+    placeholders = ", ".join("?" for _ in job_ids)
+    with _engine().connect() as conn:
+        rows = conn.exec_driver_sql(f"SELECT * FROM jobs WHERE id IN ({placeholders}) ORDER BY id",
+                                    tuple(job_ids)).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+def _claim_next():
+    with _engine().begin() as conn:
+        row = conn.exec_driver_sql("SELECT * FROM jobs WHERE Estado = ? ORDER BY id LIMIT 1",
+                                   (PENDIENTE,)).fetchone()
+        if row is None:
+            return None
+        conn.exec_driver_sql("UPDATE jobs SET Estado = ?, Iniciado = ? WHERE id = ?", (EN_CURSO, _now(), row.id))
+    return _row_to_job(row)
+
+def _finish(job_id, status, result=None, error=None):
+    with _engine().begin() as conn:
+        conn.exec_driver_sql("UPDATE jobs SET Estado = ?, Resultado = ?, Error = ?, Terminado = ? WHERE id = ?",
+                             (status, json.dumps(result) if result is not None else None, error, _now(), job_id))
+    _progress.pop(job_id, None)
+
+def _run_ingestion(job):
+    # Todos los archivos del trabajo se confirman en una sola transacción
+    params = job["Parametros"]
+
+    def report(done, total):
+        _progress[job["id"]] = (done, total)
+
+    try:
+        return ingest_files([f["ruta"] for f in params["archivos"]], params["tipo_datos"], progress=report,
+                            names=[f["archivo"] for f in params["archivos"]])
+    finally:
+        for f in params["archivos"]:
+            os.remove(f["ruta"])
+
+def _run_approval(job):
+    return {"aprobados": database.approve_temp_records(job["Parametros"]["codigos"])}
+
+HANDLERS = {
+    "ingesta": _run_ingestion,
+    "aprobacion": _run_approval,
+}
+
+def run_pending():
+    # Ejecuta los trabajos pendientes en orden; devuelve cuántos procesó
+    processed = 0
+    while True:
+        job = _claim_next()
+        if job is None:
+            return processed
+        try:
+            result = HANDLERS[job["Tipo"]](job)
+        except Exception:
+            _finish(job["id"], ERROR, error=traceback.format_exc(limit=3))
+        else:
+            _finish(job["id"], TERMINADO, result)
+            snapshot.refresh_snapshot()
+        processed += 1
+
+def _worker_loop():
+    while True:
+        run_pending()
+        _wake.wait(timeout=5)
+        _wake.clear()
+
+def start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        # Trabajos que quedaron en curso al cerrarse el proceso: su transacción
+        # no se confirmó, así que se vuelven a ejecutar
+        with _engine().begin() as conn:
+            conn.exec_driver_sql("UPDATE jobs SET Estado = ? WHERE Estado = ?", (PENDIENTE, EN_CURSO))
+        _worker = threading.Thread(target=_worker_loop, name="cola-trabajos", daemon=True)
+        _worker.start()
@@ -1,22 +1,38 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
-import base64
-from config import REGIONS, MONTHLY_GOALS, MESES, logo
-from data_processing import load_and_process_data
-from database import (load_main_database, load_temp_database, save_temp_database, 
-                      save_main_database, load_locales_db, save_locales_db, init_db, 
-                      load_locations_to_supervise, load_inconsistencias, save_inconsistencias,
-                      load_all_data)
-from visualization import create_heatmap
+import os
+from config import get_logo, PAGE_SIZE
+from database import (load_temp_database, ensure_schema, load_locales_coverage, available_locales_query,
+                      load_coverage_by_region, load_coverage_comunas, rank_undercovered_comunas,
+                      supervisiones_query, load_inconsistencias, load_filter_options, get_query_stats,
+                      reset_query_stats, get_versions)
+from exports import export_query, FORMATS
+from snapshot import load_supervisiones
+from jobs import submit_upload, submit_approval, get_jobs, start_worker, EN_CURSO, TERMINADO, ERROR
+from visualization import create_heatmap, create_region_pies, create_progress_pie, create_progress_bars
+from aggregation import (build_cube, select_month, select_year, summary_metrics, fiscalized_by_region,
+                         fiscalized_matrix)
+from goals import (load_goal_matrix, goal_years, goal_months, goals_by_region, goals_table,
+                   goal_percentages)
+from forecasting import forecast_month, attainment, MODELS
+from normalization import MESES_CALENDARIO
 from utils import compare_with_client_list
+from cache import get_cache_stats, get_cache_memory, memory_usage
+from profiling import start_run, end_run, mark_section, summarize, DEFAULT_TRACE_FILE
 
-# Inicializar la base de datos
-init_db()
+st.set_page_config(page_title="Supervisores CMC360 Dashboard", page_icon=get_logo(), layout="wide")
 
-st.set_page_config(page_title="Supervisores CMC360 Dashboard", page_icon=logo, layout="wide")
+# Verificar el esquema una sola vez por proceso; la carga desde Excel se hace
+# aparte con `python manage.py init-db`
+@st.cache_resource(show_spinner=False)
+def init_schema():
+    ensure_schema()
+    # Hilo que procesa las cargas y aprobaciones encoladas
+    start_worker()
+
+init_schema()
 
 # Agregar estilos personalizados
 st.markdown("""
@@ -41,8 +57,92 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def show_jobs(job_ids):
+    # Estado de los trabajos encolados en esta sesión
+    jobs = get_jobs(job_ids)
+    if not jobs:
+        return
+    st.subheader("Trabajos en cola")
+    for job in jobs:
+        files = job["Parametros"].get("archivos")
+        label = ", ".join(f["archivo"] for f in files) if files else "Aprobación de registros"
+        if job["Estado"] == EN_CURSO and job["Avance"]:
+            done, total = job["Avance"]
+            st.progress(min(done / total, 1.0), text=f"#{job['id']} {label}: procesadas {done} de {total} filas")
+        elif job["Estado"] == TERMINADO and job["Tipo"] == "ingesta":
+            result = job["Resultado"]
+            if result["nuevos"] == 0 and result["conflictos"] == 0:
+                st.warning(f"#{job['id']} {label}: todos los registros ya existen en la base de datos.")
+            else:
+                st.success(f"#{job['id']} {label}: se agregaron {result['nuevos']} nuevos registros a la "
+                           f"base de datos temporal y {result['conflictos']} registros en conflicto "
+                           "a inconsistencias.")
+            if result["duplicados"]:
+                st.info(f"Se omitieron {result['duplicados']} registros idénticos a los ya cargados.")
+            if len(result["archivos"]) > 1:
+                st.dataframe(pd.DataFrame(result["archivos"]).T)
+            without_code = sum(info.get("sin_codigo", 0) for info in result["archivos"].values())
+            if without_code:
+                st.warning(f"Se descartaron {without_code} filas sin código interno.")
+            # Nombres sin equivalencia en normalizacion.csv
+            for tipo, names in result["desconocidos"].items():
+                st.warning(f"Valores de {tipo} sin equivalencia en normalizacion.csv: " + ", ".join(names))
+        elif job["Estado"] == TERMINADO:
+            st.success(f"#{job['id']}: {job['Resultado']['aprobados']} registros aprobados movidos "
+                       "a la base de datos principal")
+        elif job["Estado"] == ERROR:
+            st.error(f"#{job['id']} {label}: error al procesar.\n\n{job['Error']}")
+        else:
+            st.info(f"#{job['id']} {label}: {job['Estado'].replace('_', ' ')}")
+    if any(job["Estado"] not in (TERMINADO, ERROR) for job in jobs):
+        st.button("Actualizar estado de los trabajos")
+
+def show_page(df, key, page_size=PAGE_SIZE):
+    # Solo la página elegida viaja al navegador
+    pages = max(1, -(-len(df) // page_size))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1, key=key)
+    start = (page - 1) * page_size
+    st.dataframe(df.iloc[start:start + page_size])
+    if pages > 1:
+        st.caption(f"Filas {start + 1} a {min(start + page_size, len(df))} de {len(df)}")
+
+def show_export(label, name, query, key):
+    # El archivo se genera en el servidor por bloques desde SQL y se entrega con
+    # st.download_button; la página ya no lleva el CSV incrustado
+    fmt = st.selectbox("Formato", list(FORMATS), key=f"{key}_formato")
+    if st.button(label, key=f"{key}_preparar"):
+        with st.spinner("Preparando archivo..."):
+            st.session_state[key] = export_query(name, *query, fmt=fmt)
+    # El botón se muestra solo en el rerun que preparó el archivo: cada
+    # download_button vuelve a copiar el archivo completo al almacén de medios
+    path = st.session_state.pop(key, None)
+    if path and path.endswith("." + fmt) and os.path.exists(path):
+        with open(path, "rb") as f:
+            st.download_button(f"Descargar {name}.{fmt}", f, file_name=f"{name}.{fmt}", mime=FORMATS[fmt],
+                               key=f"{key}_descarga")
+
+def show_profile(records):
+    # Panel oculto (?admin=1): desglose del rerun por sección y función
+    with st.sidebar.expander("Perfil del rerun", expanded=True):
+        sections = records[records["tipo"] == "sección"]
+        st.write(f"{sections['ms'].sum():.1f} ms en {len(sections)} secciones")
+        st.dataframe(summarize(records))
+        st.dataframe(records)
+        st.checkbox(f"Guardar trazas en {DEFAULT_TRACE_FILE}", key="perfil_traza")
+
 def main():
     
+    # Reiniciar los tiempos de SQLite de este rerun
+    reset_query_stats()
+
+    # Perfilado opcional del rerun, solo con ?admin=1 en la URL
+    admin = st.query_params.get("admin") == "1"
+    if admin:
+        start_run(trace_file=DEFAULT_TRACE_FILE if st.session_state.get("perfil_traza") else None)
+        mark_section("Filtros")
+
     def load_css(file_name):
         with open(file_name) as f:
             st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
@@ -51,77 +151,64 @@ def main():
     
     st.title("Reporte de Supervisión de Locales")
 
-    # Cargar todos los datos
-    all_data = load_all_data()
+    # Valores de los filtros desde consultas DISTINCT/MIN/MAX
+    filter_options = load_filter_options()
 
     # Sidebar
-    st.sidebar.image(logo, width=90)
+    st.sidebar.image(get_logo(), width=90)
     st.sidebar.header("Filtros")
     
+    # Metas por año y mes desde la tabla metas
+    goal_data = load_goal_matrix()
+    years = goal_years(goal_data)
+    if len(years) > 1:
+        selected_year = st.sidebar.selectbox("Año de las metas", years, index=len(years) - 1)
+    else:
+        selected_year = years[0] if years else None
+    months = goal_months(goal_data, selected_year)
+
     # Mover la selección de mes al sidebar
-    selected_month = st.sidebar.selectbox("Seleccionar mes para las metas y visualización", ["Total"] + MESES)
+    selected_month = st.sidebar.selectbox("Seleccionar mes para las metas y visualización", ["Total"] + months)
     
-    supervisors = all_data["Nombre_Supervisor"].unique()
+    supervisors = filter_options["supervisors"]
     selected_supervisor = st.sidebar.multiselect("Supervisor", supervisors)
     
-    regions = all_data["Region"].unique()
+    regions = filter_options["regions"]
     selected_region = st.sidebar.multiselect("Región", regions)
     
-    if not all_data.empty and "Fecha" in all_data.columns:
-        min_date = all_data["Fecha"].min().date()
-        max_date = all_data["Fecha"].max().date()
-        if pd.notnull(min_date) and pd.notnull(max_date):
-            start_date = st.sidebar.date_input("Fecha de inicio", min_date)
-            end_date = st.sidebar.date_input("Fecha de fin", max_date)
-        else:
-            start_date = st.sidebar.date_input("Fecha de inicio")
-            end_date = st.sidebar.date_input("Fecha de fin")
+    min_date = filter_options["min_date"]
+    max_date = filter_options["max_date"]
+    if pd.notnull(min_date) and pd.notnull(max_date):
+        start_date = st.sidebar.date_input("Fecha de inicio", min_date.date())
+        end_date = st.sidebar.date_input("Fecha de fin", max_date.date())
     else:
         start_date = st.sidebar.date_input("Fecha de inicio")
         end_date = st.sidebar.date_input("Fecha de fin")
 
     # Subir archivo
-    uploaded_file = st.file_uploader("Cargar archivo de supervisión", type=["xls", "xlsx"])
-    if uploaded_file is not None:
-        data_type = st.radio("Tipo de datos", ["Fiscalizados", "Prefiscalizados", "Fiscalizados CMC"])
-        
-        df = load_and_process_data(uploaded_file, data_type)
-        
-        # Verificar duplicados en all_data
-        existing_codes = set(all_data["Codigo_Interno"])
-        new_records = df[~df["Codigo_Interno"].isin(existing_codes)]
-        duplicates = df[df["Codigo_Interno"].isin(existing_codes)]
-        
-        # Eliminar duplicados dentro del nuevo archivo
-        new_records = new_records.drop_duplicates(subset=["Codigo_Interno"], keep="last")
-        
-        if len(new_records) == 0 and len(duplicates) == 0:
-            st.warning("Todos los registros ya existen en la base de datos.")
-        else:
-            # Agregar nuevos registros a temp_db
-            temp_db = load_temp_database()
-            temp_db = pd.concat([temp_db, new_records])
-            save_temp_database(temp_db)
-            
-            # Guardar duplicados
-            inconsistencias_db = load_inconsistencias()
-            inconsistencias_db = pd.concat([inconsistencias_db, duplicates])
-            save_inconsistencias(inconsistencias_db)
-            
-            st.success(f"Se agregaron {len(new_records)} nuevos registros a la base de datos temporal.")
-            st.warning(f"Se encontraron {len(duplicates)} registros duplicados.")
-
-    # Aplicar filtros
-    filtered_data = all_data
-    if selected_supervisor:
-        filtered_data = filtered_data[filtered_data["Nombre_Supervisor"].isin(selected_supervisor)]
-    if selected_region:
-        filtered_data = filtered_data[filtered_data["Region"].isin(selected_region)]
-    
-    filtered_data = filtered_data[
-        (filtered_data["Fecha"].dt.date >= start_date) & 
-        (filtered_data["Fecha"].dt.date <= end_date)
-    ]
+    mark_section("Carga de archivos")
+    uploaded_files = st.file_uploader("Cargar archivos de supervisión", type=["xls", "xlsx", "csv", "parquet"],
+                                      accept_multiple_files=True)
+    job_ids = st.session_state.setdefault("trabajos", [])
+    if uploaded_files:
+        data_type = st.radio("Tipo de datos", ["Detectar por encabezados", "Fiscalizados", "Prefiscalizados",
+                                               "Fiscalizados CMC"])
+
+        # La carga se procesa en segundo plano; cada lote de archivos y tipo se encola
+        # una sola vez aunque la página se vuelva a ejecutar
+        submitted = st.session_state.setdefault("archivos_encolados", {})
+        upload_key = ",".join(f.file_id for f in uploaded_files) + f":{data_type}"
+        if upload_key not in submitted and st.button("Procesar archivos"):
+            detected = None if data_type == "Detectar por encabezados" else data_type
+            submitted[upload_key] = submit_upload(uploaded_files, detected)
+            job_ids.append(submitted[upload_key])
+
+    show_jobs(job_ids)
+
+    # Aplicar filtros en SQL: solo se leen las filas seleccionadas; el historial
+    # completo sale de la copia Parquet
+    mark_section("Métricas")
+    filtered_data = load_supervisiones(selected_supervisor, selected_region, start_date, end_date)
 
     # Métricas principales
     st.header(f"Métricas Principales - {selected_month}")
@@ -132,23 +219,26 @@ def main():
     else:
         month_data = filtered_data
 
-    col1.metric("Total Supervisiones", len(month_data))
-    col2.metric("Fiscalizados", len(month_data[month_data["Estado_Supervision"] == "Fiscalizado"]))
-    col3.metric("Prefiscalizados", len(month_data[month_data["Estado_Supervision"] == "Prefiscalizado"]))
-    col4.metric("Fiscalizados CMC", len(month_data[month_data["Tipo_Fiscalizacion"] == "CMC"]))
+    # Cubo de conteos del que salen métricas, progreso y mapa de calor
+    cube = build_cube(filtered_data)
+    month_cube = select_month(cube, selected_month)
+    metrics = summary_metrics(month_cube)
+
+    col1.metric("Total Supervisiones", metrics["total"])
+    col2.metric("Fiscalizados", metrics["fiscalizados"])
+    col3.metric("Prefiscalizados", metrics["prefiscalizados"])
+    col4.metric("Fiscalizados CMC", metrics["cmc"])
 
     # Progreso de metas
-    if selected_month in MONTHLY_GOALS or selected_month == "Total":
+    mark_section("Progreso de metas")
+    if selected_month in months or selected_month == "Total":
         st.header(f"Progreso de Metas para {selected_month}")
         
-        if selected_month != "Total":
-            current_goals = dict(zip(REGIONS, MONTHLY_GOALS[selected_month]))
-            total_goal = sum(current_goals.values())
-            total_progress = len(month_data[month_data["Estado_Supervision"] == "Fiscalizado"])
-        else:
-            current_goals = {region: sum(MONTHLY_GOALS[month][i] for month in MESES) for i, region in enumerate(REGIONS)}
-            total_goal = sum(current_goals.values())
-            total_progress = len(filtered_data[filtered_data["Estado_Supervision"] == "Fiscalizado"])
+        # Metas y avance del año seleccionado, alineados con el índice de regiones
+        goals = goals_by_region(goal_data, selected_year, selected_month)
+        total_goal = int(goals.sum())
+        goal_cube = select_year(month_cube, selected_year)
+        total_progress = summary_metrics(goal_cube)["fiscalizados"]
         
         total_progress_percentage = min((total_progress / total_goal) * 100 if total_goal > 0 else 0, 100)
 
@@ -158,10 +248,10 @@ def main():
         st.subheader("Progreso por Región")
         
         # Preparar datos para los gráficos
-        regions = list(current_goals.keys())
-        goals = list(current_goals.values())
-        progress = [len(month_data[(month_data["Region"] == region) & (month_data["Estado_Supervision"] == "Fiscalizado")]) for region in regions]
-        percentages = [min((p / g) * 100 if g > 0 else 0, 100) for p, g in zip(progress, goals)]
+        regions = goal_data["regions"].tolist()
+        progress = fiscalized_by_region(goal_cube, regions).to_numpy()
+        percentages = goal_percentages(progress, goals)
+        goals, progress = goals.tolist(), progress.tolist()
 
         # Opción de tipo de gráfico
         chart_type = st.selectbox("Seleccionar tipo de gráfico", ["Barras de progreso", "Gráfico de barras", "Gráfico de pie"])
@@ -172,47 +262,17 @@ def main():
                 st.progress(min(perc / 100, 1.0))
 
         elif chart_type == "Gráfico de barras":
-            fig = go.Figure(data=[
-                go.Bar(name='Meta', x=regions, y=goals, marker_color='#201E43'),
-                go.Bar(name='Progreso', x=regions, y=progress, marker_color='#508C9B')
-            ])
-            fig.update_layout(barmode='group', height=600, title="Progreso vs Meta por Región")
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(create_progress_bars(regions, goals, progress), use_container_width=True)
 
         elif chart_type == "Gráfico de pie":
-            st.subheader("Progreso por Región")
-            cols = st.columns(4)  # Ajusta este número según el diseño que prefieras
-            
-            for i, (region, goal, prog) in enumerate(zip(regions, goals, progress)):
-                with cols[i % 4]:  # Esto distribuirá los gráficos en las columnas
-                    remaining = max(goal - prog, 0)  # Aseguramos que el valor no sea negativo
-                    pie_data = pd.DataFrame({
-                        'Categoría': ['Fiscalizados', 'Faltantes'],
-                        'Cantidad': [prog, remaining]
-                    })
-                    fig = px.pie(pie_data, values='Cantidad', names='Categoría',
-                                 title=f'{region}',
-                                 color_discrete_map={'Fiscalizados': '#508C9B', 'Faltantes': '#201E43'})
-                    fig.update_traces(textposition='inside', textinfo='percent+value')
-                    fig.update_layout(showlegend=False, height=300, width=300)
-                    st.plotly_chart(fig, use_container_width=True)
-                    st.write(f"Meta: {goal}")
-                    st.write(f"Progreso: {prog} ({(prog/goal*100):.2f}%)")
-                    st.write(f"Faltante: {remaining}")
+            # Todas las regiones en una sola figura memorizada por sus datos
+            st.plotly_chart(create_region_pies(tuple(regions), tuple(goals), tuple(progress)),
+                            use_container_width=True)
 
             # Gráfico de pie para el total
             st.subheader("Progreso Total")
             total_remaining = max(total_goal - total_progress, 0)
-            total_pie_data = pd.DataFrame({
-                'Categoría': ['Fiscalizados', 'Faltantes'],
-                'Cantidad': [total_progress, total_remaining]
-            })
-            fig_total = px.pie(total_pie_data, values='Cantidad', names='Categoría',
-                               title='Progreso Total',
-                               color_discrete_map={'Fiscalizados': '#508C9B', 'Faltantes': '#201E43'})
-            fig_total.update_traces(textposition='inside', textinfo='percent+value')
-            fig_total.update_layout(height=400, width=400)
-            st.plotly_chart(fig_total, use_container_width=True)
+            st.plotly_chart(create_progress_pie(total_progress, total_goal), use_container_width=True)
             st.write(f"Meta total: {total_goal}")
             st.write(f"Progreso total: {total_progress} ({(total_progress/total_goal*100):.2f}%)")
             st.write(f"Faltante total: {total_remaining}")
@@ -226,15 +286,41 @@ def main():
         })
         st.dataframe(progress_df)
 
+        # Proyección al cierre del mes seleccionado o, con "Total", del último mes con datos
+        max_date = filter_options["max_date"]
+        forecast_target = selected_month
+        if forecast_target == "Total" and pd.notnull(max_date) and max_date.year == selected_year:
+            forecast_target = MESES_CALENDARIO[max_date.month - 1]
+        if forecast_target in months:
+            st.subheader(f"Proyección al cierre de {forecast_target}")
+            model = st.selectbox("Modelo de proyección", list(MODELS), format_func=MODELS.get)
+            region_goals = pd.Series(goals_by_region(goal_data, selected_year, forecast_target),
+                                     index=goal_data["regions"])
+            forecast = attainment(forecast_month(selected_year, forecast_target, "Region", model), region_goals)
+            at_risk = forecast[(forecast["Meta"] > 0) & (forecast["Probabilidad_Meta"] < 0.5)]
+            if not at_risk.empty:
+                st.warning("Regiones con riesgo de no cumplir la meta: " + ", ".join(at_risk.index))
+            without_data = forecast[(forecast["Meta"] > 0) & forecast["Probabilidad_Meta"].isna()]
+            if not without_data.empty:
+                st.info("Regiones sin fiscalizados en el mes, sin datos para proyectar: "
+                        + ", ".join(without_data.index))
+            st.dataframe(forecast[["Fiscalizados", "Meta", "Ritmo_Diario", "Proyeccion", "Inferior", "Superior",
+                                   "Proyeccion_%", "Probabilidad_Meta"]].round(1))
+            with st.expander("Proyección por supervisor"):
+                st.dataframe(forecast_month(selected_year, forecast_target, "Nombre_Supervisor", model)
+                             [["Fiscalizados", "Ritmo_Diario", "Proyeccion", "Inferior", "Superior"]].round(1))
+
     # Estado de Locales
+    mark_section("Estado de locales")
     st.header("Estado de Locales")
 
-    locations_to_supervise = load_locations_to_supervise(all_data)
+    # Conteo por estado resuelto en SQL (locales_db adjunta a supervisiones.db)
+    coverage = load_locales_coverage()
 
-    total_locales = len(locations_to_supervise)
-    fiscalizados = len(locations_to_supervise[locations_to_supervise['Estado_Supervision'] == 'Fiscalizado'])
-    prefiscalizados = len(locations_to_supervise[locations_to_supervise['Estado_Supervision'] == 'Prefiscalizado'])
-    disponibles = len(locations_to_supervise[locations_to_supervise['Estado_Supervision'] == 'Disponible'])
+    total_locales = int(coverage.sum())
+    fiscalizados = int(coverage.get('Fiscalizado', 0))
+    prefiscalizados = int(coverage.get('Prefiscalizado', 0))
+    disponibles = int(coverage.get('Disponible', 0))
 
     pie_data = {
         'Categoría': ['Fiscalizados', 'Prefiscalizados', 'Disponibles'],
@@ -254,39 +340,46 @@ def main():
     st.write(f"Prefiscalizados: {prefiscalizados}")
     st.write(f"Disponibles: {disponibles}")
 
-    # Botón para descargar locales disponibles
-    if st.button("Descargar Locales Disponibles"):
-        locales_disponibles = locations_to_supervise[locations_to_supervise['Estado_Supervision'] == 'Disponible']
-        csv = locales_disponibles.to_csv(index=False)
-        b64 = base64.b64encode(csv.encode()).decode()
-        href = f'<a href="data:file/csv;base64,{b64}" download="locales_disponibles.csv">Descargar CSV</a>'
-        st.markdown(href, unsafe_allow_html=True)
+    # Cobertura por región y comuna desde el índice precalculado
+    st.subheader("Cobertura por Región y Comuna")
+    st.dataframe(load_coverage_by_region(), hide_index=True)
+    coverage_regions = load_coverage_by_region()["Region"].tolist()
+    coverage_region = st.selectbox("Detalle por comuna de la región", ["Todas"] + coverage_regions)
+    coverage_region = None if coverage_region == "Todas" else coverage_region
+    if coverage_region is not None:
+        st.dataframe(load_coverage_comunas(coverage_region), hide_index=True)
+    st.write("Comunas con menor cobertura")
+    st.dataframe(rank_undercovered_comunas(10, coverage_region), hide_index=True)
+
+    # Descarga de locales disponibles
+    show_export("Descargar Locales Disponibles", "locales_disponibles", available_locales_query(),
+                "exportacion_locales")
 
     # Mapa de calor
+    mark_section("Mapa de calor")
     st.header("Mapa de Calor - Metas de Fiscalización")
     
-    # Calcular los datos de fiscalización real
-    fiscalized_data = {}
-    for region in REGIONS:
-        for month in MESES:
-            fiscalized_count = len(filtered_data[(filtered_data['Region'] == region) & 
-                                               (filtered_data['Mes'] == month) & 
-                                               (filtered_data['Estado_Supervision'] == 'Fiscalizado')])
-            fiscalized_data[(region, month)] = fiscalized_count
+    # Fiscalizados por región y mes tomados del cubo
+    fiscalized_data = fiscalized_matrix(select_year(cube, selected_year), goal_data["regions"], months)
     
-    fig_heatmap = create_heatmap(MONTHLY_GOALS, fiscalized_data)
+    fig_heatmap = create_heatmap(goals_table(goal_data, selected_year), fiscalized_data)
     st.plotly_chart(fig_heatmap, use_container_width=True)
 
     # Mostrar datos
+    mark_section("Datos")
     st.header("Datos")
-    st.dataframe(month_data)
+    show_page(month_data, "pagina_datos")
+    show_export("Exportar datos filtrados", "supervisiones",
+                supervisiones_query(selected_supervisor, selected_region, start_date, end_date, selected_month),
+                "exportacion_datos")
 
     # Mostrar datos duplicados
     st.header("Datos Duplicados")
     duplicates_data = load_inconsistencias()
-    st.dataframe(duplicates_data)
+    show_page(duplicates_data, "pagina_duplicados")
 
     # Comparación con lista del cliente
+    mark_section("Comparación con lista del cliente")
     st.header("Comparación con Lista del Cliente")
     client_list_file = st.file_uploader("Cargar lista de aprobados del cliente", type=["xls", "xlsx"])
     if client_list_file is not None:
@@ -299,18 +392,38 @@ def main():
 
         # Opción para aprobar y mover a la base de datos principal
         if st.button("Aprobar y Mover a Base de Datos Principal"):
-            temp_db = load_temp_database()
-            approved_records = temp_db[temp_db['Codigo_Interno'].isin(client_list['Codigo_Interno'])]
-            approved_records['Aprobado'] = True
-            main_db = load_main_database()
-            main_db = pd.concat([main_db, approved_records])
-            save_main_database(main_db)
-            
-            # Eliminar registros aprobados de la base de datos temporal
-            temp_db = temp_db[~temp_db['Codigo_Interno'].isin(client_list['Codigo_Interno'])]
-            save_temp_database(temp_db)
-            
-            st.success("Registros aprobados movidos a la base de datos principal")
+            # La aprobación se encola detrás de las cargas pendientes
+            job_id = submit_approval(client_list['Codigo_Interno'])
+            job_ids.append(job_id)
+            st.info(f"Aprobación encolada (trabajo #{job_id}); su estado aparece en \"Trabajos en cola\".")
+
+    # Tiempo gastado en SQLite durante este rerun
+    mark_section("Paneles de diagnóstico")
+    query_stats = get_query_stats()
+    with st.sidebar.expander("Tiempos SQLite"):
+        st.write(f"{len(query_stats)} consultas, {sum(q['ms'] for q in query_stats):.1f} ms")
+        st.dataframe(pd.DataFrame(query_stats))
+
+    # Aciertos y fallos de la caché de datos
+    with st.sidebar.expander("Caché de datos"):
+        st.dataframe(pd.DataFrame(get_cache_stats()).T)
+        st.write("Versiones de tablas:", get_versions())
+
+    # Los datos filtrados son copias superficiales de la caché compartida; solo
+    # cuentan para la sesión los objetos que se construyen en este rerun
+    with st.sidebar.expander("Memoria"):
+        shared_memory = get_cache_memory()
+        session_objects = {"Cubo de conteos": cube}
+        if selected_month != "Total":
+            session_objects["Datos del mes"] = month_data
+        session_memory = {name: memory_usage(value) for name, value in session_objects.items()}
+        st.write(f"Caché compartida: {sum(shared_memory.values()) / 1e6:.2f} MB")
+        st.dataframe(pd.Series(shared_memory, name="bytes"))
+        st.write(f"Esta sesión: {sum(session_memory.values()) / 1e6:.2f} MB")
+        st.dataframe(pd.Series(session_memory, name="bytes"))
+
+    if admin:
+        show_profile(end_run())
 
 hide_st_style = """
             <style>
@@ -0,0 +1,94 @@
+import argparse
+
+import pandas as pd
+
+import database
+import reports
+import snapshot
+from data_processing import HEADER_SIGNATURES
+from ingestion import expand_paths, ingest_files
+from normalization import normalize_names
+
+def cmd_init_db(args):
+    imported = database.init_db(force=args.force, directory=args.directory)
+    print(f"Esquema en versión {database.get_schema_version()}.")
+    if not imported:
+        print("Sin cambios en los libros Excel; no se importó nada.")
+
+def cmd_import_metas(args):
+    # Archivo con columnas Anio, Mes, Region, Meta (una fila por región y mes)
+    reader = pd.read_csv if args.file.lower().endswith(".csv") else pd.read_excel
+    metas = reader(args.file)
+    metas["Region"], unknown = normalize_names(metas["Region"].astype(str), "region")
+    if unknown:
+        print("Regiones sin equivalencia en normalizacion.csv: " + ", ".join(sorted(unknown)))
+    database.ensure_schema()
+    print(f"{database.save_metas(metas)} metas importadas.")
+
+def cmd_ingest(args):
+    paths = expand_paths(args.paths)
+    if not paths:
+        print("No se encontraron archivos para cargar.")
+        return
+    database.ensure_schema()
+    try:
+        summary = ingest_files(paths, args.type, workers=args.workers,
+                               progress=lambda done, total: print(f"Procesadas {done} de {total} filas"))
+    except ValueError as error:
+        # Ningún archivo del lote se escribe si uno no se puede leer
+        raise SystemExit(f"Carga cancelada: {error}")
+    for name, info in summary["archivos"].items():
+        print(f"{name}: {info['filas']} filas ({info['tipo_datos']})")
+        if info["sin_codigo"] or info["sin_fecha"]:
+            print(f"  descartadas: {info['sin_codigo']} sin código, {info['sin_fecha']} sin fecha válida")
+    print(f"{summary['nuevos']} nuevos en temp_database, {summary['conflictos']} conflictos en "
+          f"inconsistencias, {summary['duplicados']} duplicados exactos omitidos.")
+    for tipo, names in summary["desconocidos"].items():
+        print(f"Valores de {tipo} sin equivalencia en normalizacion.csv: " + ", ".join(names))
+    snapshot.refresh_snapshot()
+
+def cmd_report(args):
+    database.ensure_schema()
+    paths = reports.generate_reports(args.by, args.format, args.output, args.year, args.month,
+                                     args.only, args.workers)
+    print(f"{len(paths)} archivos generados en {args.output}.")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Tareas de administración del reporte de supervisión")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    init_parser = subparsers.add_parser("init-db", help="Aplicar migraciones e importar los libros Excel modificados")
+    init_parser.add_argument("--force", action="store_true", help="Reimportar aunque el contenido no haya cambiado")
+    init_parser.add_argument("--directory", default=".", help="Carpeta donde buscar los libros Excel")
+    init_parser.set_defaults(func=cmd_init_db)
+
+    metas_parser = subparsers.add_parser("import-metas", help="Agregar o actualizar metas desde un CSV o Excel")
+    metas_parser.add_argument("file", help="Archivo con columnas Anio, Mes, Region y Meta")
+    metas_parser.set_defaults(func=cmd_import_metas)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Cargar varios archivos o carpetas en una sola transacción")
+    ingest_parser.add_argument("paths", nargs="+", help="Archivos o carpetas con archivos de supervisión")
+    ingest_parser.add_argument("--type", choices=list(HEADER_SIGNATURES),
+                               help="Tipo de datos; por defecto se detecta por los encabezados de cada archivo")
+    ingest_parser.add_argument("--workers", type=int, help="Procesos de lectura (por defecto, uno por núcleo)")
+    ingest_parser.set_defaults(func=cmd_ingest)
+
+    report_parser = subparsers.add_parser("report", help="Generar reportes por región o supervisor sin abrir el dashboard")
+    report_parser.add_argument("--by", choices=reports.GROUPINGS, default="region", help="Un reporte por región o por supervisor")
+    report_parser.add_argument("--format", nargs="+", choices=reports.FORMATS, default=["xlsx"],
+                               help="Formatos de salida (uno o más)")
+    report_parser.add_argument("--output", default="reportes", help="Carpeta de salida")
+    report_parser.add_argument("--year", type=int, help="Año de las metas; por defecto el último cargado")
+    report_parser.add_argument("--month", default="Total", help="Mes del resumen (nombre en español) o Total")
+    report_parser.add_argument("--only", nargs="+", help="Limitar a estas regiones o supervisores")
+    report_parser.add_argument("--workers", type=int, help="Procesos de escritura (por defecto, uno por núcleo)")
+    report_parser.set_defaults(func=cmd_report)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from config import REGIONS
+
+# Tabla editable de equivalencias: tipo (region/supervisor), origen, destino
+MAPPINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "normalizacion.csv")
+
+# Nombres de mes en español indexados por dt.month - 1
+MESES_CALENDARIO = pd.Index(["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+                             "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"])
+
+@lru_cache(maxsize=None)
+def load_mappings(path=MAPPINGS_FILE):
+    # Se lee una sola vez por proceso; reload_mappings() fuerza la relectura
+    table = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8")
+    return {tipo: dict(zip(group["origen"], group["destino"])) for tipo, group in table.groupby("tipo")}
+
+def reload_mappings():
+    load_mappings.cache_clear()
+
+def canonical_names(tipo):
+    names = set(load_mappings().get(tipo, {}).values())
+    if tipo == "region":
+        names.update(REGIONS)
+    return names
+
+def normalize_names(series, tipo):
+    # Traduce solo las categorías distintas y reconstruye la columna por códigos.
+    # Devuelve la columna categórica y los nombres que no están en la tabla.
+    mapping = load_mappings().get(tipo, {})
+    values = series.astype("category")
+    categories = values.cat.categories
+    if len(categories) == 0:
+        return values, set()
+
+    known = canonical_names(tipo)
+    unknown = {name for name in categories if name not in mapping and name not in known}
+
+    targets = pd.Index([mapping.get(name, name) for name in categories])
+    new_categories = targets.unique()
+    remap = new_categories.get_indexer(targets)
+    codes = values.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, remap[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, new_categories), index=series.index), unknown
+
+def month_names(fechas):
+    # Nombre del mes por índice entero, sin depender del locale de strftime
+    months = fechas.dt.month.fillna(0).astype(int).to_numpy() - 1
+    return pd.Series(pd.Categorical.from_codes(months, MESES_CALENDARIO), index=fechas.index)
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+
+# Perfilado opcional: sin un rerun activo (start_run) ni PERFIL_TRAZA, los
+# decoradores solo agregan una consulta a una variable local del hilo.
+# Con PERFIL_TRAZA=archivo.jsonl se perfilan todos los hilos y procesos
+# (cola de trabajos, manage.py) y cada medición se agrega a ese archivo.
+TRACE_FILE = os.environ.get("PERFIL_TRAZA")
+DEFAULT_TRACE_FILE = "perfil.jsonl"
+
+_local = threading.local()
+_trace_lock = threading.Lock()
+# Reruns que usan tracemalloc; se detiene cuando el último termina
+_memory_lock = threading.Lock()
+_memory_users = 0
+
+def _active():
+    return getattr(_local, "records", None) is not None or TRACE_FILE is not None
+
+def _rows(result, args):
+    # Filas del resultado, o de la primera tabla recibida (funciones de escritura)
+    for value in (result,) + args:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return len(value)
+    return None
+
+def _memory():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+def _record(name, kind, start, memory_start, rows, error=None):
+    memory_end = _memory()
+    record = {
+        "nombre": name,
+        "tipo": kind,
+        "nivel": getattr(_local, "depth", 0),
+        "ms": (time.perf_counter() - start) * 1000,
+        "filas": rows,
+        "memoria_mb": (memory_end - memory_start) / 2**20 if memory_start is not None and memory_end is not None else None,
+        "error": error,
+    }
+    if getattr(_local, "records", None) is not None:
+        _local.records.append(record)
+    trace_file = getattr(_local, "trace_file", None) or TRACE_FILE
+    if trace_file:
+        _write_trace(trace_file, dict(record, fecha=datetime.now().isoformat(timespec="milliseconds"),
+                                      hilo=threading.current_thread().name, pid=os.getpid(),
+                                      rerun=getattr(_local, "run_id", None)))
+
+def _write_trace(path, record):
+    with _trace_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+def profiled(func=None, name=None):
+    # Decorador: tiempo, filas y memoria asignada por cada llamada
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active():
+                return func(*args, **kwargs)
+            start, memory_start = time.perf_counter(), _memory()
+            _local.depth = getattr(_local, "depth", 0) + 1
+            try:
+                result = func(*args, **kwargs)
+            except Exception as error:
+                _local.depth -= 1
+                _record(label, "función", start, memory_start, None, repr(error))
+                raise
+            _local.depth -= 1
+            _record(label, "función", start, memory_start, _rows(result, args))
+            return result
+
+        return wrapper
+    return decorator(func) if func is not None else decorator
+
+def mark_section(name):
+    # Cierra la sección anterior del rerun y abre otra; las funciones llamadas
+    # dentro quedan un nivel más abajo
+    if not _active():
+        return
+    _close_section()
+    _local.section = (name, time.perf_counter(), _memory())
+    _local.depth = 1
+
+def _close_section():
+    section = getattr(_local, "section", None)
+    if section is None:
+        return
+    _local.section, _local.depth = None, 0
+    _record(section[0], "sección", section[1], section[2], None)
+
+def start_run(memory=True, trace_file=None):
+    # Empieza a registrar el rerun del hilo actual. La memoria se mide con
+    # tracemalloc, que también cuenta lo que asignen otras sesiones en paralelo.
+    global _memory_users
+    if getattr(_local, "records", None) is not None:
+        # Rerun anterior interrumpido (excepción o st.rerun) en este mismo hilo
+        end_run()
+    _local.records, _local.trace_file, _local.depth = [], trace_file, 0
+    _local.run_id = datetime.now().strftime("%H%M%S%f")
+    _local.memory = memory
+    if memory:
+        with _memory_lock:
+            if _memory_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _memory_users += 1
+
+def end_run():
+    # Termina el rerun y devuelve sus mediciones en orden de término
+    global _memory_users
+    _close_section()
+    records = getattr(_local, "records", None) or []
+    if getattr(_local, "memory", False):
+        with _memory_lock:
+            _memory_users -= 1
+            if _memory_users == 0 and TRACE_FILE is None:
+                tracemalloc.stop()
+    _local.records, _local.trace_file, _local.memory = None, None, False
+    return pd.DataFrame(records, columns=["nombre", "tipo", "nivel", "ms", "filas", "memoria_mb", "error"])
+
+def summarize(records):
+    # Totales por nombre: llamadas, tiempo y filas
+    if records.empty:
+        return records
+    return (records.groupby(["tipo", "nombre"], sort=False)
+            .agg(llamadas=("ms", "size"), ms=("ms", "sum"), filas=("filas", "sum"), memoria_mb=("memoria_mb", "sum"))
+            .sort_values("ms", ascending=False))
+
+if TRACE_FILE is not None:
+    tracemalloc.start()
@@ -0,0 +1,130 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pandas as pd
+
+import database
+from aggregation import (build_cube, select_month, select_year, select_region, summary_metrics,
+                         fiscalized_matrix, status_counts)
+from goals import load_goal_matrix, goal_years, goal_months, goals_table, goal_percentages
+from normalization import MESES_CALENDARIO
+
+# Reportes sin Streamlit: mismas consultas y agregaciones que el dashboard.
+# Plotly solo se importa al generar HTML.
+FORMATS = ("csv", "xlsx", "html")
+GROUPINGS = ("region", "supervisor")
+
+def _file_slug(name):
+    return re.sub(r"\W+", "_", str(name)).strip("_") or "reporte"
+
+def _unique_slugs(names):
+    # Nombres que solo difieren en espacios o signos dan el mismo slug: los
+    # siguientes llevan un sufijo numérico (sin distinguir mayúsculas, por Windows)
+    slugs, used = {}, set()
+    for name in names:
+        base = slug = _file_slug(name)
+        number = 1
+        while slug.casefold() in used:
+            number += 1
+            slug = f"{base}_{number}"
+        used.add(slug.casefold())
+        slugs[name] = slug
+    return slugs
+
+def _summary_table(cube, goal=None):
+    metrics = summary_metrics(cube)
+    summary = {"Total Supervisiones": metrics["total"], "Fiscalizados": metrics["fiscalizados"],
+               "Prefiscalizados": metrics["prefiscalizados"], "Fiscalizados CMC": metrics["cmc"]}
+    if goal is not None:
+        summary["Meta"] = goal
+        summary["Porcentaje"] = round(float(goal_percentages(metrics["fiscalizados"], goal)), 2)
+    return pd.DataFrame([summary])
+
+def region_report(cube, goal_data, coverage, region, year, month="Total"):
+    # Resumen, avance mensual contra la meta y cobertura por comuna de una región
+    months = goal_months(goal_data, year)
+    region_cube = select_region(select_year(cube, year), region)
+    goals = goals_table(goal_data, year).loc[region]
+    achieved = fiscalized_matrix(region_cube, [region], months).loc[region]
+    goal = int(goals.sum() if month == "Total" else goals.get(month, 0))
+    by_month = pd.DataFrame({"Meta": goals, "Fiscalizados": achieved,
+                             "Porcentaje": goal_percentages(achieved, goals).round(2)})
+    by_month.index.name = "Mes"
+    return {
+        "Resumen": _summary_table(select_month(region_cube, month), goal),
+        "Metas por mes": by_month.reset_index(),
+        "Comunas": coverage[coverage["Region"] == region].drop(columns="Region").reset_index(drop=True),
+    }
+
+def supervisor_report(data, supervisor, year, month="Total"):
+    # Resumen y conteos por región y por mes de un supervisor
+    cube = select_year(build_cube(data[data["Nombre_Supervisor"] == supervisor]), year)
+    return {
+        "Resumen": _summary_table(select_month(cube, month)),
+        "Por región": status_counts(select_month(cube, month), "Region").reset_index(),
+        "Por mes": status_counts(cube, "Mes").sort_index(key=MESES_CALENDARIO.get_indexer).reset_index(),
+    }
+
+def build_reports(by="region", year=None, month="Total", names=None):
+    # Tablas de cada reporte: {nombre: {sección: DataFrame}}
+    data = database.query_supervisiones()
+    goal_data = load_goal_matrix()
+    years = goal_years(goal_data)
+    year = year or (years[-1] if years else None)
+    if by == "region":
+        cube = build_cube(data)
+        coverage = database.load_locales_coverage_by_area()
+        names = names or goal_data["regions"].tolist()
+        return {name: region_report(cube, goal_data, coverage, name, year, month) for name in names}
+    names = names or sorted(data["Nombre_Supervisor"].dropna().unique().tolist())
+    return {name: supervisor_report(data, name, year, month) for name in names}
+
+def _render_html(name, tables):
+    sections = [f"<h1>{name}</h1>"]
+    if "Metas por mes" in tables:
+        from visualization import create_progress_bars
+        by_month = tables["Metas por mes"]
+        figure = create_progress_bars(by_month["Mes"], by_month["Meta"], by_month["Fiscalizados"],
+                                      title="Progreso vs Meta por Mes", height=400)
+        sections.append(figure.to_html(full_html=False, include_plotlyjs="cdn"))
+    for title, table in tables.items():
+        sections.append(f"<h2>{title}</h2>" + table.to_html(index=False))
+    return "<html><head><meta charset='utf-8'></head><body>" + "".join(sections) + "</body></html>"
+
+def render_report(name, tables, fmt, directory, slug=None):
+    # Escribe un reporte en el formato pedido; devuelve las rutas creadas
+    base = os.path.join(directory, slug or _file_slug(name))
+    if fmt == "csv":
+        paths = []
+        for title, table in tables.items():
+            paths.append(f"{base}_{_file_slug(title)}.csv")
+            table.to_csv(paths[-1], index=False)
+        return paths
+    if fmt == "xlsx":
+        with pd.ExcelWriter(base + ".xlsx") as writer:
+            for title, table in tables.items():
+                table.to_excel(writer, sheet_name=title[:31], index=False)
+        return [base + ".xlsx"]
+    if fmt == "html":
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(_render_html(name, tables))
+        return [base + ".html"]
+    raise ValueError(f"Formato no soportado: {fmt}")
+
+def generate_reports(by="region", formats=("xlsx",), directory="reportes", year=None, month="Total",
+                     names=None, workers=None):
+    # Las tablas se calculan una vez en este proceso y la escritura de los
+    # archivos se reparte entre procesos
+    reports = build_reports(by, year, month, names)
+    os.makedirs(directory, exist_ok=True)
+    slugs = _unique_slugs(reports)
+    tasks = [(name, tables, fmt, directory, slugs[name]) for name, tables in reports.items() for fmt in formats]
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        results = [render_report(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+            results = list(pool.map(render_report, *zip(*tasks)))
+    return [path for paths in results for path in paths]
@@ -0,0 +1,175 @@
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import database
+from cache import cached
+from profiling import profiled
+
+# Copia columnar (Parquet) de las tablas de supervisión para arranques rápidos
+SNAPSHOT_DIR = "snapshots"
+MANIFEST = "manifest.json"
+LOCK_FILE = ".lock"
+
+SCHEMA = pa.schema(
+    [("id", pa.int64()), ("Fecha", pa.timestamp("ns")), ("Codigo_Interno", pa.string())]
+    + [(column, pa.dictionary(pa.int32(), pa.string())) for column in database.CATEGORICAL_COLUMNS]
+    + [("Aprobado", pa.int64())]
+)
+
+@contextmanager
+def _snapshot_lock(exclusive):
+    # Bloqueo sobre un archivo, válido entre hilos y procesos (app, cola de
+    # trabajos, manage.py): lecturas compartidas y refresh_snapshot exclusivo.
+    # En Windows msvcrt solo bloquea en exclusivo; ahí las lecturas se turnan.
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(os.path.join(SNAPSHOT_DIR, LOCK_FILE), "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK se rinde tras 10 s de espera
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _manifest_path():
+    return os.path.join(SNAPSHOT_DIR, MANIFEST)
+
+def _read_manifest():
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_manifest(manifest):
+    tmp_path = _manifest_path() + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, _manifest_path())
+
+def _to_arrow(df):
+    df = df.copy()
+    df["Fecha"] = pd.to_datetime(df["Fecha"], format="ISO8601")
+    if "Aprobado" not in df.columns:
+        df["Aprobado"] = None
+    df["Aprobado"] = df["Aprobado"].astype("Int64")
+    for column in database.CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype("category")
+    return pa.Table.from_pandas(df[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+def _write_part(table, df, number, generation):
+    # Cada parte lleva un nombre nuevo: nunca se sobrescribe un archivo que un
+    # lector pueda tener abierto o mapeado en memoria
+    directory = os.path.join(SNAPSHOT_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    name = f"part-g{generation}-{number:05d}-{uuid.uuid4().hex[:8]}.parquet"
+    pq.write_table(_to_arrow(df), os.path.join(directory, name))
+    return name
+
+@profiled
+def refresh_snapshot():
+    # Agrega solo las filas nuevas (id mayor al último copiado) si la tabla solo
+    # creció; si hubo borrados o reemplazos (otra generación), reescribe la tabla completa
+    with _snapshot_lock(exclusive=True):
+        manifest = _read_manifest()
+        changed = False
+        for table in database.SUPERVISION_TABLES:
+            rows, max_id, generation = database.get_table_state(table)
+            entry = manifest.get(table, {"rows": 0, "max_id": 0, "generation": generation, "parts": []})
+            same_generation = entry.get("generation") == generation
+            if table in manifest and same_generation and entry["rows"] == rows and entry["max_id"] == max_id:
+                continue
+            columns = ", ".join(["id"] + database.TABLE_COLUMNS[table])
+            new_rows = database._read_sql(f"SELECT {columns} FROM {table} WHERE id > ? ORDER BY id",
+                                          params=(entry["max_id"],))
+            if entry["parts"] and same_generation and entry["rows"] + len(new_rows) == rows:
+                parts = entry["parts"] + [_write_part(table, new_rows, len(entry["parts"]), generation)]
+            else:
+                full = database._read_sql(f"SELECT {columns} FROM {table} ORDER BY id")
+                parts = [_write_part(table, full, 0, generation)]
+            manifest[table] = {"rows": rows, "max_id": max_id, "generation": generation, "parts": parts}
+            changed = True
+        if changed:
+            # Primero el manifiesto nuevo (reemplazo atómico), después se borran las partes viejas
+            _write_manifest(manifest)
+        _remove_unlisted_parts(manifest)
+        return changed
+
+def _remove_unlisted_parts(manifest):
+    # Partes que ya no están en el manifiesto: las reemplazadas recién y las que
+    # no se pudieron borrar antes (en Windows un archivo abierto o mapeado no se borra)
+    for table in database.SUPERVISION_TABLES:
+        directory = os.path.join(SNAPSHOT_DIR, table)
+        listed = set(manifest.get(table, {}).get("parts", []))
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if name not in listed:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+def is_fresh():
+    manifest = _read_manifest()
+    for table in database.SUPERVISION_TABLES:
+        entry = manifest.get(table)
+        if entry is None or (entry["rows"], entry["max_id"], entry.get("generation")) != database.get_table_state(table):
+            return False
+    return True
+
+def _read_table_parts(table, entry):
+    parts = [pq.read_table(os.path.join(SNAPSHOT_DIR, table, part), memory_map=True) for part in entry["parts"]]
+    return pa.concat_tables(parts) if parts else SCHEMA.empty_table()
+
+@cached(database.SUPERVISION_TABLES)
+@profiled
+def load_snapshot():
+    # Dataset unificado desde Parquet mapeado en memoria, con la misma
+    # deduplicación que la vista supervisiones
+    if not is_fresh():
+        refresh_snapshot()
+    # Manifiesto y partes se leen con el bloqueo compartido: refresh_snapshot no
+    # puede borrar partes en medio de la lectura
+    with _snapshot_lock(exclusive=False):
+        manifest = _read_manifest()
+        tables = [_read_table_parts(table, manifest[table]) for table in database.SUPERVISION_TABLES]
+        df = pa.concat_tables(tables).to_pandas()
+    # Igual que en SQL, las filas con código o fecha nulos no se comparan entre sí
+    keys = df["Codigo_Interno"].notna() & df["Fecha"].notna()
+    df = df[~(df.duplicated(subset=["Codigo_Interno", "Fecha"], keep="last") & keys)]
+    return database.typed_supervisiones(df.drop(columns="id").reset_index(drop=True))
+
+def load_supervisiones(supervisors=(), regions=(), start_date=None, end_date=None):
+    # Sin filtros de supervisor/región y con el rango completo de fechas se usa la
+    # copia Parquet; cualquier otra selección se resuelve en SQL
+    options = database.load_filter_options()
+    if not supervisors and not regions and pd.notnull(options["min_date"]):
+        full_range = ((start_date is None or pd.Timestamp(start_date) <= options["min_date"].normalize())
+                      and (end_date is None or pd.Timestamp(end_date) >= options["max_date"].normalize()))
+        if full_range:
+            data = load_snapshot()
+            if start_date is not None or end_date is not None:
+                # El filtro de fechas en SQL descarta las filas sin fecha
+                data = data[data["Fecha"].notna()].reset_index(drop=True)
+            return data
+    return database.query_supervisiones(supervisors, regions, start_date, end_date)
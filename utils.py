@@ -1,17 +1,35 @@
+# Columnas de detalle que se conservan en cada discrepancia
+DETAIL_COLUMNS = ['Codigo_Interno', 'Fecha', 'Nombre_Supervisor', 'Region', 'Estado_Supervision']
+
 def compare_with_client_list(temp_db, client_list):
-    temp_set = set(temp_db['Codigo_Interno'])
-    client_set = set(client_list['Codigo_Interno'])
+    # Primer registro por código en cada lado, igual que el .iloc[0] anterior
+    temp_first = temp_db.drop_duplicates(subset='Codigo_Interno', keep='first')
+    temp_first = temp_first[[c for c in DETAIL_COLUMNS if c in temp_first.columns]]
+    client_first = client_list.drop_duplicates(subset='Codigo_Interno', keep='first')
+
+    # Un único merge con indicador reemplaza las búsquedas código a código
+    merged = temp_first.merge(client_first, on='Codigo_Interno', how='outer',
+                              suffixes=('', '_cliente'), indicator=True)
+
+    temp_columns = list(temp_first.columns)
+    client_columns = ['Codigo_Interno'] + [f'{c}_cliente' if c in temp_columns else c
+                                           for c in client_first.columns if c != 'Codigo_Interno']
+
+    only_temp = merged.loc[merged['_merge'] == 'left_only', temp_columns]
+    only_client = merged.loc[merged['_merge'] == 'right_only', client_columns]
+    only_client = only_client.rename(columns=lambda c: c.removesuffix('_cliente'))
+    both = merged[merged['_merge'] == 'both']
+
+    if 'Estado_Supervision_cliente' in merged.columns:
+        different = both.loc[both['Estado_Supervision'] != both['Estado_Supervision_cliente'],
+                             temp_columns + ['Estado_Supervision_cliente']]
+    else:
+        different = both.loc[both.index[:0], temp_columns]
 
     discrepancies = {
-        'En temp_db pero no aprobado': list(temp_set - client_set),
-        'Aprobado pero no en temp_db': list(client_set - temp_set),
-        'Diferencias en clasificación': []
+        'En temp_db pero no aprobado': only_temp.reset_index(drop=True),
+        'Aprobado pero no en temp_db': only_client.reset_index(drop=True),
+        'Diferencias en clasificación': different.reset_index(drop=True)
     }
 
-    for code in temp_set.intersection(client_set):
-        temp_status = temp_db[temp_db['Codigo_Interno'] == code]['Estado_Supervision'].iloc[0]
-        client_status = client_list[client_list['Codigo_Interno'] == code]['Estado_Supervision'].iloc[0]
-        if temp_status != client_status:
-            discrepancies['Diferencias en clasificación'].append((code, temp_status, client_status))
-
-    return discrepancies
\ No newline at end of file
+    return discrepancies
@@ -1,26 +1,41 @@
 # visualization.py
 
-import plotly.express as px
+from functools import lru_cache
+
 import pandas as pd
 from config import REGIONS
 
+# Plotly se importa dentro de cada función para que importar este módulo
+# (p. ej. desde reports.py) no cargue la librería
+
+# Colores de Fiscalizados / Faltantes en los gráficos de pie
+PIE_COLORS = ['#508C9B', '#201E43']
+PIE_COLUMNS = 4
+
+# Las figuras se memorizan por sus datos agregados (tuplas); se comparten entre
+# reruns y sesiones, por lo que no deben modificarse después de crearlas
+FIGURE_CACHE_SIZE = 64
+
 def create_heatmap(monthly_goals, fiscalized_data):
-    # Crear un DataFrame con los datos del mapa de calor
-    df_heatmap = pd.DataFrame(monthly_goals, index=REGIONS)
-    
-    # Calcular el porcentaje de cumplimiento
-    for month in df_heatmap.columns:
-        for region in df_heatmap.index:
-            goal = df_heatmap.loc[region, month]
-            achieved = fiscalized_data.get((region, month), 0)
-            percentage = min((achieved / goal) * 100 if goal > 0 else 0, 100)
-            df_heatmap.loc[region, month] = percentage
+    # Matriz de metas (regiones x meses) y fiscalizados alineados con ella
+    goals = pd.DataFrame(monthly_goals, index=REGIONS)
+    achieved = fiscalized_data.reindex(index=goals.index, columns=goals.columns, fill_value=0)
     
+    # Calcular el porcentaje de cumplimiento de forma vectorizada
+    df_heatmap = (achieved / goals.where(goals > 0) * 100).fillna(0).clip(upper=100)
+
+    return _heatmap_figure(tuple(df_heatmap.index), tuple(df_heatmap.columns),
+                           tuple(map(tuple, df_heatmap.values.tolist())))
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def _heatmap_figure(regions, months, percentages):
+    import plotly.express as px
+
     # Crear el mapa de calor con Plotly Express
-    fig = px.imshow(df_heatmap.values,
+    fig = px.imshow(percentages,
                     labels=dict(x="Mes", y="Región", color="Porcentaje"),
-                    x=df_heatmap.columns,
-                    y=df_heatmap.index,
+                    x=list(months),
+                    y=list(regions),
                     aspect="auto",
                     color_continuous_scale="RdYlGn")  
     
@@ -33,6 +48,46 @@ def create_heatmap(monthly_goals, fiscalized_data):
     )
     
     # Añadir los valores en cada celda
-    fig.update_traces(text=df_heatmap.values, texttemplate="%{text:.1f}%", textfont={"size":10})
+    fig.update_traces(text=percentages, texttemplate="%{text:.1f}%", textfont={"size":10})
     
-    return fig
\ No newline at end of file
+    return fig
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def create_region_pies(regions, goals, progress, columns=PIE_COLUMNS):
+    # Una sola figura con un pie por región en lugar de una figura por región
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    rows = -(-len(regions) // columns)
+    titles = [f"{region}<br>{prog} de {goal} ({(prog / goal * 100) if goal else 0:.1f}%)"
+              for region, goal, prog in zip(regions, goals, progress)]
+    fig = make_subplots(rows=rows, cols=columns, specs=[[{"type": "domain"}] * columns] * rows,
+                        subplot_titles=titles)
+    for i, (region, goal, prog) in enumerate(zip(regions, goals, progress)):
+        fig.add_trace(go.Pie(labels=['Fiscalizados', 'Faltantes'], values=[prog, max(goal - prog, 0)],
+                             name=region, sort=False, marker_colors=PIE_COLORS,
+                             textposition='inside', textinfo='percent+value'),
+                      row=i // columns + 1, col=i % columns + 1)
+    fig.update_annotations(font_size=11)
+    fig.update_layout(height=260 * rows, margin=dict(t=60, b=20), title="Progreso por Región")
+    return fig
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def create_progress_pie(progress, goal, title='Progreso Total'):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Pie(labels=['Fiscalizados', 'Faltantes'], values=[progress, max(goal - progress, 0)],
+                           sort=False, marker_colors=PIE_COLORS,
+                           textposition='inside', textinfo='percent+value'))
+    fig.update_layout(title=title, height=400, width=400)
+    return fig
+
+def create_progress_bars(labels, goals, progress, title="Progreso vs Meta por Región", height=600):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=[
+        go.Bar(name='Meta', x=list(labels), y=list(goals), marker_color='#201E43'),
+        go.Bar(name='Progreso', x=list(labels), y=list(progress), marker_color='#508C9B')
+    ])
+    fig.update_layout(barmode='group', height=height, title=title)
+    return fig